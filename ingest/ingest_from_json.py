@@ -2,6 +2,8 @@
 from __future__ import annotations
 from typing import Dict, Any, List, Tuple
 
+from utils.articles import numero_int
+
 # --- normalización (con fallback para no romper si falta el módulo) ---
 try:
     from ingest.normalization import canonical, slugify  # proyecto
@@ -99,6 +101,7 @@ def upsert_document(graph, d: Dict[str, Any]) -> Dict[str, Any]:
             cooked.append({
                 "id": aid,
                 "numero": numero,
+                "numero_int": numero_int(numero),
                 "titulo": a.get("titulo"),
                 "texto": a.get("texto")
             })
@@ -106,8 +109,8 @@ def upsert_document(graph, d: Dict[str, Any]) -> Dict[str, Any]:
             graph.run("""
                 UNWIND $arts AS a
                 MERGE (art:Articulo {id:a.id})
-                  ON CREATE SET art.numero=a.numero, art.titulo=a.titulo, art.texto=a.texto
-                  ON MATCH  SET art.numero=a.numero, art.titulo=a.titulo, art.texto=a.texto
+                  ON CREATE SET art.numero=a.numero, art.numero_int=a.numero_int, art.titulo=a.titulo, art.texto=a.texto
+                  ON MATCH  SET art.numero=a.numero, art.numero_int=a.numero_int, art.titulo=a.titulo, art.texto=a.texto
             """, arts=cooked)
             graph.run("""
                 MATCH (d:Documento {id:$id})
@@ -2,7 +2,7 @@
 # pages/0_🔎_Consulta.py — versión corregida (usa run_cypher + UI pulida)
 from __future__ import annotations
 
-import io
+import pickle
 import re
 import time
 from typing import Tuple, Optional
@@ -11,8 +11,15 @@ import pandas as pd
 import streamlit as st
 
 # --- Integraciones del proyecto
-from utils.graph_client import get_graph, run_cypher   # <- ahora válido (alias en graph_client)
-from utils.text_to_cypher import gen as rules_gen      # retrocompatible
+from utils.graph_client import get_graph, run_data, run_data_cached  # lecturas con caché (st.cache_data)
+from utils.text_to_cypher import gen_params as rules_gen_params  # (cypher, params)
+from utils.export import to_csv_bytes
+try:
+    from streamlit.runtime.caching.cache_errors import UnserializableReturnValueError
+except Exception:  # streamlit antiguo: solo el error de pickle
+    UnserializableReturnValueError = pickle.PicklingError
+# únicos fallos que justifican repetir la lectura sin caché
+_UNCACHEABLE = (UnserializableReturnValueError, pickle.PicklingError)
 try:
     # si existe el generador extendido (gen_ex), úsalo para reportar el motor
     from utils.text_to_cypher import gen_ex as rules_gen_ex  # (cypher, engine)
@@ -90,14 +97,18 @@ def _safe_rerun():
             pass
 
 def _clear_query():
-    for k in ("last_cypher","last_engine","last_question","q_input"):
+    for k in ("last_cypher","last_params","last_engine","last_question","q_input"):
         st.session_state.pop(k, None)
     _safe_rerun()
 
+_RE_FULLTEXT_CALL = re.compile(r"\bcall\s+db\.index\.fulltext\.querynodes\b")
+
 def is_safe_cypher(cy: str) -> bool:
     """Bloquea operaciones de escritura o potencialmente peligrosas."""
     bad = [" create "," merge "," delete "," set "," detach "," drop "," load csv"," call db."," call apoc.create"]
     low = f" {cy.lower()} "
+    # las búsquedas full-text son de solo lectura: no deben caer en " call db."
+    low = _RE_FULLTEXT_CALL.sub(" ", low)
     return not any(tok in low for tok in bad)
 
 _DEF_ART_RX = re.compile(r"\b(art(?:iculo)?\s*(\d+[a-z]?))\b", re.IGNORECASE)
@@ -288,16 +299,14 @@ def _generate():
         return
     engine_sel = engine
     try:
-        cy = ""; used = ""
-        # 1) Reglas (si existe gen_ex, lo usamos para reportar motor interno)
-        def _rules(q: str) -> Tuple[str, str]:
-            if callable(rules_gen_ex):
-                cy_r, eng = rules_gen_ex(q, mode="auto")  # rules → fulltext → (gpt_stub) → help
-                return cy_r, f"rules:{eng}"
-            return rules_gen(q), "rules"
+        cy = ""; used = ""; params: dict = {}
+        # 1) Reglas parametrizadas ($term/$id_like): Neo4j reutiliza el plan entre preguntas
+        def _rules(q: str) -> Tuple[str, str, dict]:
+            cy_r, p = rules_gen_params(q)
+            return cy_r, "rules:rules" if callable(rules_gen_ex) else "rules", p
 
         if engine_sel == "Solo Reglas":
-            cy, used = _rules(question)
+            cy, used, params = _rules(question)
         elif engine_sel == "Solo GPT":
             cy = _gpt_nl2cypher(question, st.session_state.get("openai_model_ui"))
             used = "openai"
@@ -305,34 +314,44 @@ def _generate():
             cy = _gpt_nl2cypher(question, st.session_state.get("openai_model_ui"))
             used = "auto(gpt)"
             if not cy or cy == "FALLBACK":
-                cy, used = _rules(question)
+                cy, used, params = _rules(question)
                 used = "auto(" + used + ")"
 
         if not cy or cy == "FALLBACK":
             fb = _fallback_from_question(question)
             if fb:
                 cy = fb
+                params = {}
                 used = used + "+fallback"
 
         cy = _normalize_return(cy)
         st.session_state["last_cypher"] = cy
+        st.session_state["last_params"] = params
         st.session_state["last_engine"] = used
         st.session_state["last_question"] = question
         log_event("generate", question, engine_sel, st.session_state.get("openai_model_ui") if engine_sel!="Solo Reglas" else None, cy, "ok" if cy and cy!="FALLBACK" else "fallback")
     except Exception as e:
         st.session_state["last_cypher"] = None
+        st.session_state["last_params"] = {}
         st.session_state["last_engine"] = ""
         log_event("generate", question, engine_sel, st.session_state.get("openai_model_ui") if engine_sel!="Solo Reglas" else None, "", "error", error=str(e))
         st.error(f"No pude generar Cypher: {e}")
 
-def _run_and_show(cy: str) -> tuple[Optional[pd.DataFrame], str | None]:
+def _fetch_rows(cy: str, params: Optional[dict] = None) -> list[dict]:
+    """Filas vía caché de lecturas; sin caché si el resultado no es serializable (p. ej. nodos)."""
+    try:
+        return run_data_cached(cy, params)
+    except _UNCACHEABLE:
+        return run_data(cy, params)
+
+def _run_and_show(cy: str, params: Optional[dict] = None) -> tuple[Optional[pd.DataFrame], str | None]:
     if not cy or not cy.strip():
         return None, "No hay Cypher para ejecutar."
     if not is_safe_cypher(cy):
         return None, "El Cypher generado contiene operaciones no permitidas (CREATE/MERGE/DELETE/SET…)."
     t0 = time.time()
     try:
-        df = run_cypher(cy).to_data_frame()
+        df = pd.DataFrame(_fetch_rows(cy, params))
         ms = int((time.time() - t0) * 1000)
         return df, f"{len(df):,} filas en {ms} ms"
     except Exception as e:
@@ -341,29 +360,31 @@ def _run_and_show(cy: str) -> tuple[Optional[pd.DataFrame], str | None]:
 def _execute():
     q = st.session_state.get("last_question") or st.session_state.get("q_input","")
     cy = st.session_state.get("last_cypher")
+    params = st.session_state.get("last_params") or {}
     if not cy:
         st.warning("Genera primero el Cypher.")
         return
 
     # --- Rescate automático: si el resultado de la primera opción es pobre, probamos reglas
     if engine == "Auto (GPT+Rescate)":
-        def _count_rows(cy_: str) -> int:
+        def _count_rows(cy_: str, params_: dict) -> int:
             try:
-                return len(run_cypher(cy_).to_data_frame())
+                return len(_fetch_rows(cy_, params_))  # misma caché que _run_and_show
             except Exception:
                 return -1
-        n_first = _count_rows(cy)
+        n_first = _count_rows(cy, params)
         if n_first <= 1:
-            cy_rules = rules_gen(q)
+            cy_rules, p_rules = rules_gen_params(q)
             cy_rules = _normalize_return(cy_rules)
-            n_rules = _count_rows(cy_rules)
+            n_rules = _count_rows(cy_rules, p_rules)
             if n_rules > n_first:
-                cy = cy_rules
+                cy, params = cy_rules, p_rules
                 st.info("🤝 Rescate automático: se usó Reglas locales por mejor cobertura de resultados.")
                 st.session_state["last_cypher"] = cy
+                st.session_state["last_params"] = params
                 st.session_state["last_engine"] = (st.session_state.get("last_engine") or "auto") + "→rules"
 
-    df, how = _run_and_show(cy)
+    df, how = _run_and_show(cy, params)
     if df is None:
         st.error(how)
         log_event("execute", q, engine, st.session_state.get("openai_model_ui") if engine!="Solo Reglas" else None, cy, "error", error=how)
@@ -387,6 +408,8 @@ def _execute():
     with cR:
         # Copiar Cypher
         st.code(st.session_state.get("last_cypher") or "", language="cypher")
+        if params:
+            st.caption(f"Parámetros: {params}")
         st.button("📋 Copiar Cypher", use_container_width=True, on_click=lambda: st.session_state.update({"_copy": True}), key="copybtn")
         if st.session_state.get("_copy"):
             st.toast("Cypher copiado (selección rápida desde el bloque).")
@@ -394,9 +417,7 @@ def _execute():
 
     # Descarga CSV
     try:
-        buff = io.StringIO()
-        df.to_csv(buff, index=False)
-        st.download_button("⬇️ Descargar CSV", data=buff.getvalue().encode("utf-8"),
+        st.download_button("⬇️ Descargar CSV", data=to_csv_bytes(df),
                            file_name="resultado.csv", mime="text/csv")
     except Exception:
         pass
@@ -422,6 +443,8 @@ cy_last = st.session_state.get("last_cypher")
 if cy_last:
     st.success("Cypher generado (previsualización):")
     st.code(cy_last, language="cypher")
+    if st.session_state.get("last_params"):
+        st.caption(f"Parámetros: {st.session_state['last_params']}")
 
 st.markdown("<hr class='app-sep'/>", unsafe_allow_html=True)
 
@@ -8,6 +8,7 @@ from typing import List, Tuple
 import pandas as pd
 import streamlit as st
 
+from utils.articles import numero_int
 from utils.graph_client import run_cypher
 from utils.text_to_cypher import gen  # ✅ ahora acepta doc_id opcional
 
@@ -108,14 +109,17 @@ MATCH (d:Documento {id:$doc})
 WITH d, COUNT { (d)-[:TIENE_ARTICULO]->(:Articulo) } AS before
 UNWIND $arts AS art
 MERGE (a:Articulo {id: d.id + '-art-' + art.numero})
-ON CREATE SET a.numero = art.numero, a.texto = art.texto
-ON MATCH  SET a.numero = art.numero, a.texto = art.texto
+ON CREATE SET a.numero = art.numero, a.numero_int = art.numero_int, a.texto = art.texto
+ON MATCH  SET a.numero = art.numero, a.numero_int = art.numero_int, a.texto = art.texto
 MERGE (d)-[:TIENE_ARTICULO]->(a)
 WITH d, before
 MATCH (d)-[:TIENE_ARTICULO]->(x:Articulo)
 RETURN before, COUNT(x) AS after
 """
-    payload = [{"numero": a.numero, "texto": a.texto} for a in arts]
+    payload = [
+        {"numero": a.numero, "numero_int": numero_int(a.numero), "texto": a.texto}
+        for a in arts
+    ]
     df = run_cypher(cy, parameters={"doc": doc_id, "arts": payload}).to_data_frame()
     if df.empty:
         return 0, 0
@@ -10,6 +10,7 @@ try:
     from utils.graph_client import get_graph, run_cypher
 except Exception:
     from utils.graph_client import get_graph, run_cypher  # fallback
+from utils.export import to_csv_bytes
 
 # ──────────────────────────────────────────────────────────────────────────────
 # Config
@@ -49,7 +50,7 @@ def _csv_button(df: pd.DataFrame, name: str):
         return
     st.download_button(
         "⬇️ Descargar CSV",
-        data=df.to_csv(index=False).encode("utf-8"),
+        data=to_csv_bytes(df),
         file_name=name,
         mime="text/csv",
         use_container_width=True,
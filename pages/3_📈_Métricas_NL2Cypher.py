@@ -9,6 +9,8 @@ from datetime import datetime, timedelta
 import pandas as pd
 import streamlit as st
 
+from utils.export import to_csv_bytes
+
 LOG_PATH = os.path.join("data", "history_nl2cypher.jsonl")
 
 st.set_page_config(page_title="Métricas NL→Cypher", layout="wide")
@@ -205,7 +207,7 @@ if not df.empty:
     )
 
     # ---------- Export ----------
-    csv = f.to_csv(index=False).encode("utf-8")
+    csv = to_csv_bytes(f)
     st.download_button(
         "⬇️ Descargar CSV filtrado",
         data=csv,
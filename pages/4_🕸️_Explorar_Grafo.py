@@ -2,14 +2,20 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import annotations
-from typing import Dict, List, Optional
+from typing import Dict, List
 
-import os
-import tempfile
+import json
+import re
 import pandas as pd
 import streamlit as st
 
+try:
+    import orjson  # serialización C del payload del grafo (opcional)
+except Exception:
+    orjson = None
+
 from utils.graph_client import run_cypher  # usa tu cliente ya existente
+from utils.export import to_csv_bytes
 
 # ------------------------------------------------------------
 # Configuración
@@ -166,32 +172,41 @@ def fetch_edges(modo: str, val: str, depth: int, limit: int, allowed: List[str])
     return cur.to_data_frame()
 
 # ------------------------------------------------------------
-# Visualización con PyVis (si está instalado)
+# Visualización con vis-network (lista de aristas JSON compacta)
 # ------------------------------------------------------------
-def draw_with_pyvis(df: pd.DataFrame) -> Optional[str]:
-    try:
-        from pyvis.network import Network
-        import streamlit.components.v1 as components
-    except Exception:
-        st.info(
-            "Para ver el grafo embebido, instala **pyvis**:\n\n"
-            "`pip install pyvis`\n\n"
-            "Mientras tanto, puedes revisar la tabla de aristas de más abajo."
-        )
-        return None
-
-    net = Network(height="740px", bgcolor="#0e1117", font_color="white", directed=False)
-    net.barnes_hut(gravity=-24000, central_gravity=0.3, spring_length=110, spring_strength=0.02)
+# La librería se carga desde CDN (cacheada por el navegador); por render solo
+# viaja el JSON de nodos/aristas, no el bundle de vis.js ni el HTML de PyVis.
+# Versión fijada a la misma que vendoriza lib/vis-9.1.2: el HTML descargado
+# sigue siendo reproducible aunque salga una major nueva.
+GRAPH_EMBED_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8">
+<script src="https://unpkg.com/vis-network@9.1.2/standalone/umd/vis-network.min.js"></script>
+<style>html,body{margin:0;background:#0e1117;}#graph{width:100%;height:740px;}</style>
+</head><body><div id="graph"></div>
+<script>
+const data = {nodes: new vis.DataSet($NODES), edges: new vis.DataSet($EDGES)};
+const options = {
+  nodes: {font: {color: "white"}},
+  edges: {font: {color: "white", strokeWidth: 0, size: 11}},
+  physics: {barnesHut: {gravitationalConstant: -24000, centralGravity: 0.3,
+                        springLength: 110, springConstant: 0.02}}
+};
+new vis.Network(document.getElementById("graph"), data, options);
+</script></body></html>
+"""
+# una sola pasada: lo ya sustituido (datos del usuario) no se vuelve a escanear
+_RE_EMBED_SLOT = re.compile(r"\$(NODES|EDGES)")
 
+def build_graph_payload(df: pd.DataFrame) -> tuple[list[dict], list[dict]]:
+    """Convierte el DataFrame de aristas en listas compactas de nodos y aristas."""
     def node_id(label: str, key: str) -> str:
         return f"{label}|{key}"
 
+    nodes: list[dict] = []
+    edges: list[dict] = []
     seen: set[str] = set()
-    for _, row in df.iterrows():
-        a_label = str(row["a_label"]); a_key = str(row["a_key"])
-        r_type  = str(row["r_type"])
-        b_label = str(row["b_label"]); b_key = str(row["b_key"])
-
+    cols = ("a_label", "a_key", "r_type", "b_label", "b_key")
+    for a_label, a_key, r_type, b_label, b_key in zip(*(df[c].astype(str) for c in cols)):
         na = node_id(a_label, a_key)
         nb = node_id(b_label, b_key)
 
@@ -202,25 +217,40 @@ def draw_with_pyvis(df: pd.DataFrame) -> Optional[str]:
             seen.add(nid)
             style = NODE_STYLE.get(lbl, {"color": "#94a3b8", "shape": "dot"})
             txt = (key[:40] + "…") if len(key) > 40 else key
-            net.add_node(
-                nid,
-                label=txt,
-                title=f"{lbl}: {key}",
-                color=style["color"],
-                shape=style["shape"],
-            )
+            nodes.append({
+                "id": nid,
+                "label": txt,
+                "title": f"{lbl}: {key}",
+                "color": style["color"],
+                "shape": style["shape"],
+            })
 
         # arista
-        edge_color = EDGE_COLOR.get(r_type, "#a1a1aa")
-        net.add_edge(na, nb, label=r_type, color=edge_color, title=r_type)
+        edges.append({
+            "from": na,
+            "to": nb,
+            "label": r_type,
+            "color": EDGE_COLOR.get(r_type, "#a1a1aa"),
+        })
+    return nodes, edges
+
+def draw_with_visjs(df: pd.DataFrame) -> str:
+    """Renderiza el subgrafo en un iframe y devuelve el HTML generado."""
+    import streamlit.components.v1 as components
+
+    def _js(obj) -> str:
+        # JSON compacto; "</" escapado para no cerrar el <script> desde los datos
+        if orjson is not None:
+            raw = orjson.dumps(obj).decode("utf-8")
+        else:
+            raw = json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+        return raw.replace("</", "<\\/")
 
-    # Guardar en un temporal y embeber
-    with tempfile.NamedTemporaryFile("w+", suffix=".html", delete=False) as tmp:
-        tmp_path = tmp.name
-    net.save_graph(tmp_path)
-    with open(tmp_path, "r", encoding="utf-8") as f:
-        components.html(f.read(), height=760, scrolling=True)
-    return tmp_path
+    nodes, edges = build_graph_payload(df)
+    payload = {"NODES": _js(nodes), "EDGES": _js(edges)}
+    html = _RE_EMBED_SLOT.sub(lambda m: payload[m.group(1)], GRAPH_EMBED_HTML)
+    components.html(html, height=760, scrolling=True)
+    return html
 
 # ------------------------------------------------------------
 # Acción principal
@@ -243,25 +273,23 @@ if explorar:
         st.info("Sin resultados para ese punto de partida, profundidad y relaciones seleccionadas.")
     else:
         st.success(f"{len(df)} aristas encontradas.")
-        html_path = draw_with_pyvis(df)
+        html = draw_with_visjs(df)
 
         # Ver/descargar datos
         with st.expander("Ver aristas como tabla"):
             st.dataframe(df, use_container_width=True)
             st.download_button(
                 "Descargar CSV",
-                data=df.to_csv(index=False).encode("utf-8"),
+                data=to_csv_bytes(df),
                 file_name="subgrafo.csv",
                 mime="text/csv",
             )
-            if html_path and os.path.exists(html_path):
-                with open(html_path, "rb") as f:
-                    st.download_button(
-                        "Descargar grafo (HTML)",
-                        f.read(),
-                        file_name="grafo.html",
-                        mime="text/html",
-                    )
+            st.download_button(
+                "Descargar grafo (HTML)",
+                html.encode("utf-8"),
+                file_name="grafo.html",
+                mime="text/html",
+            )
 
         # Ver/Copiar Cypher
         with st.expander("Ver consulta Cypher utilizada"):
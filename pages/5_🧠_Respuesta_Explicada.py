@@ -2,15 +2,16 @@
 # -*- coding: utf-8 -*-
 from __future__ import annotations
 
-import math
+import functools
 import re
 from typing import List, Tuple, Optional
 
 import pandas as pd
 import streamlit as st
 
-from utils.graph_client import run_cypher
-from utils.text_to_cypher import gen as nl2cypher
+from utils.graph_client import run_records
+from utils.text_to_cypher import gen_params as nl2cypher_params
+from utils.export import to_csv_bytes
 
 st.set_page_config(page_title="Respuesta explicada con citas", layout="wide")
 st.title("🧠 Respuesta explicada con citas del documento")
@@ -22,54 +23,23 @@ st.caption(
 # ─────────────────────────────────────────────────────────────────────────────
 # Utilidades de texto (normalización, ranking, snippets)
 # ─────────────────────────────────────────────────────────────────────────────
+_RE_KEEP = re.compile(r"[^a-z0-9\s/.-]")
+_RE_WS = re.compile(r"\s+")
+_RE_SPLIT = re.compile(r"\W+")
+_RE_LUCENE_UNSAFE = re.compile(r"[^a-z0-9\s]")
+_ACCENTS = str.maketrans("áéíóú", "aeiou")
+_ACCENT_PAIRS = [[a, b] for a, b in zip("áéíóú", "aeiou")]  # mismo plegado, en Cypher
+
 def _normalize(s: str) -> str:
-    s = (s or "").lower()
-    s = s.replace("á","a").replace("é","e").replace("í","i").replace("ó","o").replace("ú","u")
-    s = re.sub(r"[^a-z0-9\s/.-]", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return s
+    s = (s or "").lower().translate(_ACCENTS)
+    s = _RE_KEEP.sub(" ", s)
+    return _RE_WS.sub(" ", s).strip()
 
 def _tokenize(q: str) -> List[str]:
     s = _normalize(q)
-    toks = [t for t in re.split(r"\W+", s) if t and len(t) > 2]
+    toks = [t for t in _RE_SPLIT.split(s) if t and len(t) > 2]
     return toks
 
-def _score(text: str, query_tokens: List[str]) -> float:
-    if not text:
-        return 0.0
-    t = _normalize(text)
-    score = 0
-    for tok in query_tokens:
-        score += t.count(tok)
-    # penaliza textos muy largos
-    return score / math.sqrt(max(1, len(t)))
-
-def _best_snippets(text: str, query_tokens: List[str], max_snips: int = 3, window: int = 240) -> List[str]:
-    if not text:
-        return []
-    low = _normalize(text)
-    snips: List[str] = []
-    used = set()
-    for tok in query_tokens:
-        i = low.find(tok)
-        if i == -1 or tok in used:
-            continue
-        used.add(tok)
-        start = max(0, i - window // 2)
-        end = min(len(text), i + window // 2)
-        chunk = text[start:end].strip()
-        snips.append(chunk)
-        if len(snips) >= max_snips:
-            break
-    # dedupe ligero
-    out, seen = [], set()
-    for s in snips:
-        k = _normalize(s)[:60]
-        if k not in seen:
-            out.append(s)
-            seen.add(k)
-    return out
-
 # ─────────────────────────────────────────────────────────────────────────────
 # OpenAI opcional
 # ─────────────────────────────────────────────────────────────────────────────
@@ -128,51 +98,122 @@ def _llm_answer(question: str, context_blocks: List[Tuple[str, str, str]], model
 # ─────────────────────────────────────────────────────────────────────────────
 # Recuperación desde el grafo
 # ─────────────────────────────────────────────────────────────────────────────
-@st.cache_data(show_spinner=False, ttl=90)
-def _retrieve_docs_for_question(q: str, limit_docs: int = 8) -> pd.DataFrame:
+_RE_RETURN_ALIAS = re.compile(r"\bAS\s+([A-Za-z_]\w*)", re.IGNORECASE)
+_RE_LAST_RETURN = re.compile(r"(?is).*\bRETURN\b")
+
+_FULLTEXT_DOCS = """
+CALL db.index.fulltext.queryNodes('doc_fulltext', $q) YIELD node AS d, score
+RETURN d.id AS id, d.titulo AS titulo
+ORDER BY score DESC
+""".strip()
+
+# Puntuación y snippets en el servidor: por cable solo viajan hasta
+# _MAX_SNIPS ventanas de ~240 caracteres por artículo seleccionado (una por
+# término distinto encontrado, como antes), nunca el texto completo.
+_FUSED_TEMPLATE = """
+CALL {{
+{inner}
+}}
+WITH DISTINCT {proj}
+LIMIT $k
+OPTIONAL MATCH (d:Documento {{id:id}})
+WITH id, coalesce(titulo, d.titulo, id) AS doc_titulo, d
+OPTIONAL MATCH (d)-[:TIENE_ARTICULO]->(a:Articulo)
+WITH id, doc_titulo, a,
+     reduce(s = toLower(coalesce(a.texto,'')), p IN $accents | replace(s, p[0], p[1])) AS low
+WITH id, doc_titulo, a, low,
+     reduce(n = 0, t IN $toks | n + size(split(low, t)) - 1) AS hits
+WITH id, doc_titulo, a, low,
+     CASE WHEN hits > 0 THEN toFloat(hits) / sqrt(size(low)) ELSE 0.0 END AS score
+ORDER BY score DESC, doc_titulo, coalesce(a.numero_int, toInteger(a.numero), 0)
+WITH id, doc_titulo, a, score,
+     [t IN $snip_toks WHERE low CONTAINS t | size(split(low, t)[0])][..$max_snips] AS poss
+WITH collect(DISTINCT {{id:id, titulo:doc_titulo}}) AS docs,
+     collect(CASE WHEN score > 0 THEN {{
+       doc_id: id, doc_titulo: doc_titulo, art_num: a.numero, art_id: a.id, score: score,
+       snippets: [pos IN poss | trim(substring(a.texto,
+                   CASE WHEN pos < 120 THEN 0 ELSE pos - 120 END,
+                   CASE WHEN pos < 120 THEN pos + 120 ELSE 240 END))]
+     }} END) AS top
+RETURN docs, top[..$n] AS top
+""".strip()
+
+_MAX_SNIPS = 3  # ventanas por artículo
+
+def _join_snippets(snips: List[str]) -> str:
+    """Une las ventanas de un artículo, descartando las que empiezan igual."""
+    out, seen = [], set()
+    for s in snips or []:
+        k = _normalize(s)[:60]
+        if k not in seen:
+            out.append(s)
+            seen.add(k)
+    return " … ".join(out)
+
+def _question_key(q: str) -> str:
+    """
+    Clave estable para las cachés: minúsculas y espacios colapsados. No usa
+    _normalize porque el motor de reglas aún necesita las comillas del término.
+    """
+    return _RE_WS.sub(" ", (q or "").lower()).strip()
+
+@functools.lru_cache(maxsize=512)
+def _nl2cypher_cached(qk: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    cy, params = nl2cypher_params(qk)
+    return (cy or "").strip().rstrip(";"), tuple(params.items())  # inmutable: vive en caché
+
+def _return_aliases(cy: str) -> set[str]:
+    """Alias (en minúsculas) proyectados por el último RETURN del Cypher."""
+    m = _RE_LAST_RETURN.match(cy or "")
+    if not m:
+        return set()
+    return {a.lower() for a in _RE_RETURN_ALIAS.findall(cy[m.end():])}
+
+def _fused_query_for_question(q: str) -> Tuple[str, dict]:
     """
-    Usa tus reglas NL→Cypher para obtener documentos candidatos (id, titulo).
-    Si no devuelve esas columnas, hace fallback a fulltext (sanitizado para Lucene).
+    Envuelve el Cypher de tus reglas NL→Cypher (o el fallback fulltext, sanitizado
+    para Lucene) en un CALL {} y encadena la carga de artículos en la misma query.
     """
-    cy = nl2cypher(q)
-    df = run_cypher(cy).to_data_frame()
-
-    cols = [c.lower() for c in df.columns]
-    df.columns = cols
-    if {"id","titulo"}.issubset(set(cols)):
-        out = df[["id","titulo"]].drop_duplicates().head(limit_docs)
-    elif "documento" in cols and "titulo" in cols:
-        out = df.rename(columns={"documento":"id"})[["id","titulo"]].drop_duplicates().head(limit_docs)
-    elif "doc" in cols:
-        out = df.rename(columns={"doc":"id"})
-        out["titulo"] = out.get("titulo", out["id"])
-        out = out[["id","titulo"]].drop_duplicates().head(limit_docs)
+    cy, rule_params = _nl2cypher_cached(_question_key(q))
+    aliases = _return_aliases(cy)
+    params: dict = dict(rule_params)  # $term/$id_like de las reglas
+    if {"id", "titulo"} <= aliases:
+        proj = "id, titulo"
+    elif {"documento", "titulo"} <= aliases:
+        proj = "documento AS id, titulo"
+    elif "doc" in aliases:
+        proj = "doc AS id, null AS titulo"
     else:
         # fallback: fulltext (¡sanitizado para evitar errores Lucene!)
-        qn = _normalize(q)
-        safe_q = re.sub(r"[^a-z0-9\s]", " ", qn)  # elimina '/', '?', etc.
-        q_ft = """
-        CALL db.index.fulltext.queryNodes('doc_fulltext', $q) YIELD node AS d, score
-        RETURN d.id AS id, d.titulo AS titulo
-        ORDER BY score DESC
-        LIMIT $k
-        """
-        out = run_cypher(q_ft, parameters={"q": safe_q, "k": limit_docs}).to_data_frame()
-    return out
+        cy = _FULLTEXT_DOCS
+        proj = "id, titulo"
+        params = {"q": _RE_LUCENE_UNSAFE.sub(" ", _normalize(q))}  # elimina '/', '?', etc.
+    return _FUSED_TEMPLATE.format(inner=cy, proj=proj), params
 
 @st.cache_data(show_spinner=False, ttl=90)
-def _load_articles_for_docs(doc_ids: List[str]) -> pd.DataFrame:
-    """Carga artículos con su texto para un conjunto de documentos."""
-    if not doc_ids:
-        return pd.DataFrame(columns=["doc_id","doc_titulo","art_num","art_id","texto"])
-    q = """
-    MATCH (d:Documento)-[:TIENE_ARTICULO]->(a:Articulo)
-    WHERE d.id IN $ids
-    RETURN d.id AS doc_id, d.titulo AS doc_titulo,
-           a.numero AS art_num, a.id AS art_id, a.texto AS texto
-    ORDER BY d.titulo, toInteger(coalesce(a.numero,'0')), a.titulo
+def _retrieve_context_for_question(q: str, limit_docs: int = 8, limit_snips: int = 4) -> Tuple[pd.DataFrame, pd.DataFrame]:
     """
-    return run_cypher(q, parameters={"ids": doc_ids}).to_data_frame()
+    Documentos candidatos y los `limit_snips` artículos más relevantes (con sus
+    snippets calculados en Neo4j) en un solo round trip.
+    """
+    cy, params = _fused_query_for_question(q)
+    toks = _tokenize(q)
+    params.update({
+        "k": int(limit_docs),
+        "n": int(limit_snips),
+        "toks": toks,
+        "snip_toks": list(dict.fromkeys(toks)),  # una ventana por término distinto
+        "max_snips": _MAX_SNIPS,
+        "accents": _ACCENT_PAIRS,
+    })
+    rec = next(run_records(cy, parameters=params), {})  # la query devuelve una sola fila
+    df_docs = pd.DataFrame(rec.get("docs") or [], columns=["id","titulo"])
+    df_top = pd.DataFrame(
+        rec.get("top") or [],
+        columns=["doc_id","doc_titulo","art_num","art_id","score","snippets"],
+    )
+    df_top["snippet"] = df_top.pop("snippets").map(_join_snippets)
+    return df_docs, df_top
 
 # ─────────────────────────────────────────────────────────────────────────────
 # UI
@@ -196,8 +237,10 @@ if st.button("Responder", type="primary"):
         st.warning("Escribe una pregunta.")
         st.stop()
 
-    with st.spinner("Buscando documentos relevantes…"):
-        df_docs = _retrieve_docs_for_question(q, limit_docs=int(k_docs))
+    with st.spinner("Buscando documentos y fragmentos relevantes…"):
+        df_docs, df_top = _retrieve_context_for_question(
+            _question_key(q), limit_docs=int(k_docs), limit_snips=int(k_snips),
+        )
 
     if df_docs.empty:
         st.error("No encontré documentos relacionados.")
@@ -206,18 +249,11 @@ if st.button("Responder", type="primary"):
     st.success(f"Documentos candidatos: {len(df_docs)}")
     st.dataframe(df_docs, hide_index=True, use_container_width=True)
 
-    with st.spinner("Analizando artículos…"):
-        df_art = _load_articles_for_docs(df_docs["id"].tolist())
-
-    if df_art.empty:
-        st.error("Los documentos no tienen artículos con texto.")
+    if df_top.empty:
+        st.error("Ningún artículo de estos documentos contiene términos de la pregunta.")
         st.stop()
 
-    toks = _tokenize(q)
-    df_art["score"] = df_art["texto"].apply(lambda t: _score(t, toks))
-    df_art = df_art.sort_values("score", ascending=False)
-    df_top = df_art.head(int(k_snips)).copy()
-    df_top["snippet"] = df_top["texto"].apply(lambda t: "… " + " … ".join(_best_snippets(t, toks)) + " …")
+    df_top["snippet"] = "… " + df_top["snippet"] + " …"
 
     st.markdown("#### Fragmentos relevantes")
     show_cols = ["doc_id","doc_titulo","art_num","snippet"]
@@ -241,5 +277,5 @@ if st.button("Responder", type="primary"):
         st.caption("Sin API key: se muestran fragmentos como evidencia.")
 
     # Exportar citas
-    csv = df_top[["doc_id","doc_titulo","art_num","snippet"]].to_csv(index=False).encode("utf-8")
+    csv = to_csv_bytes(df_top[["doc_id","doc_titulo","art_num","snippet"]])
     st.download_button("⬇️ Descargar citas (CSV)", data=csv, file_name="citas_respuesta.csv", mime="text/csv")
@@ -1,7 +1,7 @@
 # tools/doctor.py
 import os
 import sys
-import importlib
+from importlib.util import find_spec
 from textwrap import indent
 
 OK = "✅"
@@ -50,12 +50,13 @@ def check_imports():
         "networkx",
         "plotly",
         "openai",
-        "pyvis.network",
     ]
     ok = True
     for m in mods:
         try:
-            importlib.import_module(m)
+            # solo localiza el módulo (no lo ejecuta): mucho más rápido que importarlo
+            if find_spec(m) is None:
+                raise ImportError(f"No module named '{m}'")
             print(f"{OK} import {m}")
         except Exception as e:
             ok = False
@@ -4,10 +4,8 @@ from sklearn.metrics import precision_score, recall_score, f1_score, accuracy_sc
 from sklearn.preprocessing import MultiLabelBinarizer
 
 # Función para calcular precisión, recall y F1
-def calculate_metrics(y_true, y_pred):
-    # Usar MultiLabelBinarizer para convertir las listas en una representación binaria
-    mlb = MultiLabelBinarizer()
-    y_true_bin = mlb.fit_transform(y_true)
+def calculate_metrics(mlb, y_true_bin, y_pred):
+    # El binarizador ya viene ajustado (una sola vez) sobre las etiquetas del ground truth
     y_pred_bin = mlb.transform(y_pred)
     
     # Calcular las métricas
@@ -40,6 +38,11 @@ def main():
     # Inicializar diccionario para almacenar las métricas por motor
     results = {}
 
+    # El ground truth es el mismo para todos los motores: se binariza una sola vez
+    y_true = ground_truth_df["ground_truth"].astype(str).str.split(",").map(lambda xs: list(set(xs))).tolist()
+    mlb = MultiLabelBinarizer().fit(y_true)
+    y_true_bin = mlb.transform(y_true)
+
     # Comparar las respuestas correctas con las respuestas predichas
     for engine in args.engines:
         # Nombre de la columna correspondiente al motor
@@ -48,27 +51,18 @@ def main():
         if engine_col not in predictions_df.columns:
             raise ValueError(f"El archivo de predicciones no contiene la columna '{engine_col}' para el motor {engine}.")
 
-        # Inicializar listas para almacenar las respuestas correctas y las predicciones
-        y_true = []
-        y_pred = []
-
-        for _, row in ground_truth_df.iterrows():
-            question = row['question']
-            correct_answer = row['ground_truth']
-
-            # Buscar la predicción para la misma pregunta de cada motor
-            prediction = predictions_df[predictions_df['question'] == question][engine_col].values[0]
-
-            # Convertir las respuestas a listas de elementos (si son listas de términos, artículos, etc.)
-            true_set = set(correct_answer.split(','))
-            pred_set = set(prediction.split(','))
+        # Une cada pregunta con su predicción (primera aparición) en un solo merge
+        preds = predictions_df.drop_duplicates("question")[["question", engine_col]]
+        merged = ground_truth_df[["question"]].merge(preds, on="question", how="left")
+        if merged[engine_col].isna().any():
+            faltan = merged.loc[merged[engine_col].isna(), "question"].tolist()
+            raise ValueError(f"El motor {engine} no tiene predicción para: {faltan}")
 
-            # Comparar las respuestas
-            y_true.append(list(true_set))
-            y_pred.append(list(pred_set))
+        # Convertir las respuestas a listas de elementos (si son listas de términos, artículos, etc.)
+        y_pred = merged[engine_col].astype(str).str.split(",").map(lambda xs: list(set(xs))).tolist()
 
         # Calcular métricas para cada motor
-        precision, recall, f1, accuracy = calculate_metrics(y_true, y_pred)
+        precision, recall, f1, accuracy = calculate_metrics(mlb, y_true_bin, y_pred)
         results[engine] = {
             "Precision": precision,
             "Recall": recall,
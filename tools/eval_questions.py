@@ -6,24 +6,44 @@ Evalúa NL→Cypher contra un conjunto de preguntas con ground-truth.
 Genera:
   - results/results.jsonl  (una línea por (pregunta x motor))
   - results/summary.csv    (resumen por motor)
+  - results/.gpt_cache.jsonl (caché de respuestas GPT entre ejecuciones)
+  - results/.neo4j_cache/    (resultados Neo4j por query, solo con EVAL_CACHE=1)
 
 Uso:
   python tools/eval_questions.py --engines rules rules_fb
   python tools/eval_questions.py --engines rules rules_fb gpt gpt_fb --model gpt-4o-mini
   python tools/eval_questions.py --limit 50
+  python tools/eval_questions.py --engines gpt gpt_fb --gpt-cache semantic
+  EVAL_CACHE=1 python tools/eval_questions.py --limit 50   # reutiliza resultados Neo4j en disco
+                                                           # (cached=True; sus ms no entran en el resumen)
 """
 from __future__ import annotations
 
 import argparse
+import functools
+import hashlib
 import json
+import os
+import pickle
 import re
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-import pandas as pd
-import streamlit as st  # para leer secrets (OPENAI_API_KEY/MODEL) si estuvieran
+import numpy as np
+# pandas, streamlit y py2neo (vía utils.graph_client) se importan al usarse:
+# un --help o un error de argumentos no paga ~1-2 s de imports.
+if TYPE_CHECKING:
+    import pandas as pd
+
+try:
+    import orjson  # serialización C de results.jsonl (opcional)
+except Exception:
+    orjson = None
 
 # Rutas base
 ROOT = Path(__file__).resolve().parents[1]
@@ -32,34 +52,118 @@ RESULTS_DIR = ROOT / "results"
 RESULTS_DIR.mkdir(parents=True, exist_ok=True)
 RESULTS_JSONL = RESULTS_DIR / "results.jsonl"
 SUMMARY_CSV = RESULTS_DIR / "summary.csv"
+GPT_CACHE_JSONL = RESULTS_DIR / ".gpt_cache.jsonl"
+NEO4J_CACHE_DIR = RESULTS_DIR / ".neo4j_cache"  # EVAL_CACHE=1; bórralo tras reingestar
 
 # Reutilizamos la conexión y ejecución de tu app
 sys.path.append(str(ROOT))  # añade raíz del proyecto al PYTHONPATH
-from utils.graph_client import get_graph, run_cypher  # noqa
 from utils.text_to_cypher import gen as rules_gen  # noqa
 
 
+def _get_secret(name: str, default: str = "") -> str:
+    """st.secrets si hay secrets.toml; si no, variable de entorno."""
+    try:
+        import streamlit as st
+        val = st.secrets.get(name)
+    except Exception:
+        val = None
+    return val or os.getenv(name, default)
+
+
+# ------------------------ Patrones precompilados -----------------------------
+_RE_MATCH_DOC = re.compile(r"(?is)\bMATCH\s*\(\s*([a-zA-Z][\w]*)\s*:\s*Documento\b")
+_RE_NODE_LABEL = re.compile(r"\(\s*([a-zA-Z][\w]*)\s*:\s*([A-Z][\w]*)\s*\)")
+_RE_LABEL_PROP = re.compile(r"\b([A-Z][A-Za-z0-9_]*)\.(\w+)\b")
+_RE_SOBRE_TERM = re.compile(r"sobre\s+['\"“”‘’«»]?([^'\"“”‘’«»]+)")
+_RE_WS = re.compile(r"\s+")
+_RE_CYPHER_BLOCK = re.compile(r"```(?:cypher)?\s*([\s\S]+?)```", re.IGNORECASE)
+_RE_FULLTEXT_CALL = re.compile(r"\bcall\s+db\.index\.fulltext\.querynodes\b")
+_RE_ID_IN_STR = re.compile(r"(?:\bid\b\s*[:=]\s*['\"]?)([\w\-./]+)", re.IGNORECASE)
+_RE_DOC_ALIAS = re.compile(r"\(\s*([a-zA-Z]\w*)\s*:\s*Documento\b")
+_RE_RETURN_TAIL = re.compile(r"(?is)\bRETURN\b[\s\S]*?(?=$)")
+_RE_ORDER_BY = re.compile(r"(?i)\bORDER\s+BY\b")
+_RE_ORDER_BY_TAIL = re.compile(r"(?i)\bORDER\s+BY\b[\s\S]*?(?=$)")
+
+@functools.lru_cache(maxsize=256)
+def _doc_var_patterns(var: str) -> tuple[re.Pattern, re.Pattern, re.Pattern, re.Pattern]:
+    """Patrones de _normalize_return para el alias `var` (compilados una vez por alias)."""
+    return (
+        re.compile(rf"(?i)\bRETURN\s+DISTINCT\s+{var}\b(?!\s*(?:\.|\s+AS))"),
+        re.compile(rf"(?i)\bRETURN\s+{var}\b(?!\s*(?:\.|\s+AS))"),
+        re.compile(rf"(?i),\s*{var}\b(?!\s*(?:\.|\s+AS))"),
+        re.compile(rf"(?i)\bORDER\s+BY\s+{var}\b(?!\s*\.)"),
+    )
+
+
 # ------------------------ Utilidades de Cypher -------------------------------
+# Operadores de plan que escriben (o leen ficheros); el sufijo "@neo4j" se ignora
+_WRITE_OPERATORS = ("Create", "Merge", "LockingMerge", "Set", "Delete", "DetachDelete",
+                    "Remove", "LoadCSV", "Foreach",
+                    # esquema / administración (índices, restricciones, usuarios, bases de datos)
+                    "Drop", "Alter", "Grant", "Revoke", "Deny", "Rename", "Assert",
+                    "DoNothingIf", "EnsureNode", "StartDatabase", "StopDatabase",
+                    "WaitForCompletion", "Terminate", "SetOwnPassword", "LogSystemCommand")
+# procedimientos de solo lectura admitidos en un ProcedureCall (en minúsculas, por prefijo)
+_READ_PROCEDURES = ("db.index.fulltext.querynodes", "db.index.fulltext.queryrelationships",
+                    "db.labels", "db.relationshiptypes", "db.propertykeys", "db.schema.",
+                    "db.indexes", "db.constraints", "dbms.components")
+# veredicto léxico cuando no hay plan: sin EXPLAIN, cualquier CALL restante o
+# cláusula de escritura/administración menos obvia también se rechaza
+_BAD_TOKENS_NO_PLAN = (" remove ", " foreach", " call ", " grant ", " revoke ",
+                       " alter ", " rename ", " deny ", " terminate ")
+
+def _plan_has_writes(plan) -> bool:
+    stack = [plan]
+    while stack:
+        p = stack.pop()
+        if p is None:
+            continue
+        op = str(getattr(p, "operator_type", "") or "").split("@", 1)[0]
+        if op.startswith(_WRITE_OPERATORS):
+            return True
+        if op.startswith("ProcedureCall"):
+            details = str(getattr(p, "args", None) or "").lower()
+            if not any(proc in details for proc in _READ_PROCEDURES):
+                return True  # procedimiento desconocido: puede escribir
+        stack.extend(getattr(p, "children", None) or [])
+    return False
+
+@functools.lru_cache(maxsize=4096)
+def _plan_is_safe(cy: str) -> bool:
+    """
+    EXPLAIN en el servidor (compila sin ejecutar) y revisa los operadores del
+    plan. Los errores se propagan: lru_cache no los guarda y la siguiente
+    llamada vuelve a intentarlo.
+    """
+    from utils.graph_client import run_cypher
+    return not _plan_has_writes(run_cypher(f"EXPLAIN {cy}").plan())
+
 def is_safe_cypher(cy: str) -> bool:
     """Bloquea operaciones de escritura o potencialmente peligrosas."""
     bad = [" create ", " merge ", " delete ", " set ", " detach ", " drop ", " load csv", " call db.", " call apoc.create"]
     low = f" {cy.lower()} "
-    return not any(tok in low for tok in bad)
+    # las búsquedas full-text son de solo lectura: no deben caer en " call db."
+    low = _RE_FULLTEXT_CALL.sub(" ", low)
+    if any(tok in low for tok in bad):
+        return False  # prefiltro barato: escrituras evidentes sin ir al servidor
+    try:
+        return _plan_is_safe(cy)
+    except Exception:
+        # sin plan (servidor caído, sintaxis no válida...): se decide solo por léxico
+        return not any(tok in low for tok in _BAD_TOKENS_NO_PLAN)
 
 def _normalize_return(cy: str) -> str:
     """Si se retorna el nodo Documento directamente, normaliza a id/titulo cuando se detecta alias."""
     try:
-        m = re.search(r"(?is)\bMATCH\s*\(\s*([a-zA-Z][\w]*)\s*:\s*Documento\b", cy)
+        m = _RE_MATCH_DOC.search(cy)
         if not m:
             return cy
         var = m.group(1)
-        cy = re.sub(rf"(?i)\bRETURN\s+DISTINCT\s+{var}\b(?!\s*(?:\.|\s+AS))",
-                    f"RETURN DISTINCT {var}.id AS id, {var}.titulo AS titulo", cy)
-        cy = re.sub(rf"(?i)\bRETURN\s+{var}\b(?!\s*(?:\.|\s+AS))",
-                    f"RETURN {var}.id AS id, {var}.titulo AS titulo", cy)
-        cy = re.sub(rf"(?i),\s*{var}\b(?!\s*(?:\.|\s+AS))",
-                    f", {var}.id AS id, {var}.titulo AS titulo", cy)
-        cy = re.sub(rf"(?i)\bORDER\s+BY\s+{var}\b(?!\s*\.)", "ORDER BY titulo", cy)
+        ret_distinct, ret, comma, order_by = _doc_var_patterns(var)
+        cy = ret_distinct.sub(f"RETURN DISTINCT {var}.id AS id, {var}.titulo AS titulo", cy)
+        cy = ret.sub(f"RETURN {var}.id AS id, {var}.titulo AS titulo", cy)
+        cy = comma.sub(f", {var}.id AS id, {var}.titulo AS titulo", cy)
+        cy = order_by.sub("ORDER BY titulo", cy)
         return cy
     except Exception:
         return cy
@@ -68,14 +172,14 @@ def _fix_label_props_to_alias(cy: str) -> str:
     """Cambia 'Tema.nombre' → 't.nombre' si existe MATCH (t:Tema)."""
     try:
         label2alias = {}
-        for m in re.finditer(r"\(\s*([a-zA-Z][\w]*)\s*:\s*([A-Z][\w]*)\s*\)", cy):
+        for m in _RE_NODE_LABEL.finditer(cy):
             alias, label = m.group(1), m.group(2)
             label2alias.setdefault(label, alias)
         def repl(m):
             label, prop = m.group(1), m.group(2)
             alias = label2alias.get(label)
             return f"{alias}.{prop}" if alias else m.group(0)
-        return re.sub(r"\b([A-Z][A-Za-z0-9_]*)\.(\w+)\b", repl, cy)
+        return _RE_LABEL_PROP.sub(repl, cy)
     except Exception:
         return cy
 
@@ -105,7 +209,7 @@ def _fallback_from_question(q: str) -> str | None:
     qn = q.lower().strip()
     # Modifican LO 3/2018 y tratan sobre X
     if ("modific" in qn) and any(k in qn for k in ["lo 3/2018","lo 3 2018","ley organica 3/2018","ley orgánica 3/2018"]):
-        m = re.search(r"sobre\s+['\"“”‘’«»]?([^'\"“”‘’«»]+)", qn)
+        m = _RE_SOBRE_TERM.search(qn)
         term = (m.group(1).strip() if m else "consentimiento")
         return _build_theme_fallback_fulltext(term, keep_modifica=True, keep_vigente=False)
     # Vigentes + derogan + rgpd
@@ -199,15 +303,122 @@ Ejemplos (NL → Cypher):
 """ + "\n\n".join(
     [f"- {q}\n```cypher\n{c}\n```" for q, c in FEW_SHOTS]
 )
+# Prefijo estable y byte a byte idéntico en todas las llamadas: lo variable (la
+# pregunta) va siempre en el mensaje "user" para no romper la caché de prompts.
+SCHEMA_TEXT = SCHEMA_TEXT.strip()
+
+# ------------------------ Caché GPT (exacta + semántica) ----------------------
+# Entradas persistidas en results/.gpt_cache.jsonl; el hash del prompt invalida
+# la caché cuando cambian SCHEMA_TEXT o los ejemplos few-shot.
+SCHEMA_HASH = hashlib.sha1(SCHEMA_TEXT.encode("utf-8")).hexdigest()
+PROMPT_CACHE_KEY = SCHEMA_HASH[:16]  # agrupa las llamadas con el mismo system prompt
+EMBED_MODEL = "text-embedding-3-small"
+SEMANTIC_THRESHOLD = 0.95
+SEMANTIC_MIN_ENTRIES = 20
+
+GPT_CACHE_MODE = "exact"  # "off" | "exact" | "semantic" (lo fija --gpt-cache)
+_gpt_exact: dict[tuple[str, str], str] = {}            # (model, q_norm) -> cypher
+_gpt_sem: dict[str, tuple[list[str], np.ndarray]] = {}  # model -> (cyphers, embeddings L2-normalizadas)
+_gpt_cache_lock = threading.Lock()  # escrituras desde los hilos de evaluación
+
+def _q_norm(q: str) -> str:
+    return _RE_WS.sub(" ", (q or "").lower()).strip()
+
+def _sem_add(model: str, cy: str, emb) -> None:
+    v = np.asarray(emb, dtype=np.float32)
+    n = float(np.linalg.norm(v))
+    if not n:
+        return
+    v = (v / n)[None, :]
+    cys, M = _gpt_sem.get(model, ([], None))
+    _gpt_sem[model] = (cys + [cy], v if M is None else np.vstack([M, v]))
+
+def _load_gpt_cache() -> None:
+    if not GPT_CACHE_JSONL.exists():
+        return
+    with open(GPT_CACHE_JSONL, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except Exception:
+                continue  # línea corrupta
+            if e.get("schema_hash") != SCHEMA_HASH or not _cacheable(e.get("cypher")):
+                continue  # otro prompt, o FALLBACK persistido por versiones anteriores
+            _gpt_exact[(e["model"], e["q_norm"])] = e["cypher"]
+            if e.get("emb"):
+                _sem_add(e["model"], e["cypher"], e["emb"])
+
+def _embed(version: str, client, text: str):
+    """Embedding de la pregunta (solo cliente v1); None si no se puede."""
+    if version != "v1":
+        return None
+    try:
+        return client.embeddings.create(model=EMBED_MODEL, input=text).data[0].embedding
+    except Exception:
+        return None
+
+def _cache_get(qn: str, model: str, emb=None) -> str | None:
+    if GPT_CACHE_MODE == "off":
+        return None
+    hit = _gpt_exact.get((model, qn))
+    if hit is not None or GPT_CACHE_MODE != "semantic" or emb is None:
+        return hit
+    cys, M = _gpt_sem.get(model, ([], None))
+    if M is None or len(cys) < SEMANTIC_MIN_ENTRIES:
+        return None
+    v = np.asarray(emb, dtype=np.float32)
+    sims = M @ (v / (float(np.linalg.norm(v)) or 1.0))
+    i = int(np.argmax(sims))
+    return cys[i] if sims[i] >= SEMANTIC_THRESHOLD else None
+
+def _cacheable(cy: str | None) -> bool:
+    """Solo Cypher real: un FALLBACK (respuesta rara, rechazo, error) no se reutiliza."""
+    low = (cy or "").strip().lower()
+    return bool(low) and low != "fallback" and "match" in low and "return" in low
+
+def _cache_put(qn: str, model: str, cy: str, emb=None) -> None:
+    if GPT_CACHE_MODE == "off" or not _cacheable(cy):
+        return
+    with _gpt_cache_lock:
+        _gpt_exact[(model, qn)] = cy
+        if emb is not None:
+            _sem_add(model, cy, emb)
+        try:
+            with open(GPT_CACHE_JSONL, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"q_norm": qn, "model": model, "schema_hash": SCHEMA_HASH,
+                                    "cypher": cy, "emb": emb}, ensure_ascii=False) + "\n")
+        except Exception:
+            pass  # la caché nunca debe romper la evaluación
+
+_load_gpt_cache()
+
+OPENAI_MAX_RETRIES = 3
+OPENAI_TIMEOUT = 30.0
 
+def _openai_http_client():
+    """httpx.Client con keep-alive (HTTP/2 si está instalado h2); None = el del SDK."""
+    try:
+        import httpx
+    except Exception:
+        return None
+    limits = httpx.Limits(max_connections=16, max_keepalive_connections=16)
+    try:
+        return httpx.Client(http2=True, limits=limits, timeout=OPENAI_TIMEOUT)
+    except ImportError:  # falta el paquete h2
+        return httpx.Client(limits=limits, timeout=OPENAI_TIMEOUT)
+
+@functools.lru_cache(maxsize=1)
 def _openai_client():
-    api_key = (st.secrets.get("OPENAI_API_KEY") or "").strip()
+    """Cliente único por proceso (el SDK v1 es thread-safe y reutiliza su pool HTTP)."""
+    api_key = (_get_secret("OPENAI_API_KEY") or "").strip()
     if not api_key:
         return None
     try:
         from openai import OpenAI
-        return ("v1", OpenAI(api_key=api_key))
-    except Exception:
+        # pool keep-alive compartido por los hilos; el SDK reintenta 429/5xx con backoff exponencial
+        return ("v1", OpenAI(api_key=api_key, http_client=_openai_http_client(),
+                             max_retries=OPENAI_MAX_RETRIES, timeout=OPENAI_TIMEOUT))
+    except Exception:  # SDK antiguo, httpx incompatible o kwargs no soportados
         import openai
         openai.api_key = api_key
         return ("v0", openai)
@@ -217,13 +428,22 @@ def gpt_nl2cypher(question: str, model_hint: str | None = None) -> str:
     if not cli_tuple:
         return "FALLBACK"
     version, client = cli_tuple
-    model = (model_hint or st.secrets.get("OPENAI_MODEL") or "gpt-4o-mini").strip()
+    model = (model_hint or _get_secret("OPENAI_MODEL") or "gpt-4o-mini").strip()
+    qn = _q_norm(question)
+    cached = _cache_get(qn, model)
+    if cached is not None:
+        return cached
+    emb = _embed(version, client, qn) if GPT_CACHE_MODE == "semantic" else None
+    cached = _cache_get(qn, model, emb)
+    if cached is not None:
+        return cached
     try:
         if version == "v1":
             msg = client.chat.completions.create(
                 model=model, temperature=0.0,
                 messages=[{"role":"system","content":SCHEMA_TEXT},
                           {"role":"user","content":question.strip()}],
+                extra_body={"prompt_cache_key": PROMPT_CACHE_KEY},  # vía extra_body: vale para SDKs antiguos
             )
             content = msg.choices[0].message.content or ""
         else:
@@ -234,11 +454,14 @@ def gpt_nl2cypher(question: str, model_hint: str | None = None) -> str:
             )["choices"][0]["message"]["content"]
     except Exception:
         return "FALLBACK"
-    m = re.search(r"```(?:cypher)?\s*([\s\S]+?)```", content, flags=re.IGNORECASE)
+    m = _RE_CYPHER_BLOCK.search(content)
     if m:
-        return m.group(1).strip()
-    looks_cypher = any(tok in content.lower() for tok in ["match", "return"])
-    return content.strip() if looks_cypher else "FALLBACK"
+        cy = m.group(1).strip()
+    else:
+        looks_cypher = any(tok in content.lower() for tok in ["match", "return"])
+        cy = content.strip() if looks_cypher else "FALLBACK"
+    _cache_put(qn, model, cy, emb)  # ignora lo que no sea Cypher válido
+    return cy
 
 
 # ------------------------ Métricas ------------------------------------------
@@ -253,7 +476,7 @@ def extract_ids(df: pd.DataFrame) -> set[str]:
     # 1) id explícito
     if "id" in low:
         c = cols[low.index("id")]
-        return set(map(lambda x: str(x).strip(), df[c].dropna().astype(str).tolist()))
+        return set(df[c].dropna().astype(str).str.strip())
 
     def _try_get_id(v):
         # dict plano
@@ -283,14 +506,6 @@ def extract_ids(df: pd.DataFrame) -> set[str]:
                 return str(props["id"])
         except Exception:
             pass
-        # regex sobre str(v)
-        try:
-            s = str(v)
-            m = re.search(r"(?:\bid\b\s*[:=]\s*['\"]?)([\w\-./]+)", s, flags=re.IGNORECASE)
-            if m:
-                return m.group(1)
-        except Exception:
-            pass
         return None
 
     # 2) barrido por columnas object buscando 'id' en celdas
@@ -298,21 +513,24 @@ def extract_ids(df: pd.DataFrame) -> set[str]:
         ser = df[c]
         if ser.dtype != "object":
             continue
-        vals = ser.dropna().tolist()
-        if not vals:
+        ser = ser.dropna()
+        if ser.empty:
             continue
-        got = []
-        for v in vals:
-            vid = _try_get_id(v)
-            if vid:
-                got.append(vid)
-        if got:
-            return set(got)
+        # acceso estructurado (dict/Node) celda a celda; el regex sobre str(v)
+        # de las que quedan se resuelve de una vez con .str.extract
+        got = ser.map(_try_get_id)
+        rest = got.isna()
+        if rest.any():
+            got[rest] = ser[rest].astype(str).str.extract(_RE_ID_IN_STR, expand=False)
+        got = got.dropna()
+        got = got[got != ""]
+        if not got.empty:
+            return set(got.astype(str))
 
     # 3) fallback a primera columna de texto
     for c in cols:
         if df[c].dtype == "object":
-            return set(map(lambda x: str(x).strip(), df[c].dropna().astype(str).tolist()))
+            return set(df[c].dropna().astype(str).str.strip())
 
     return set()
 
@@ -332,16 +550,16 @@ def prf(pred: set[str], gold: set[str]) -> tuple[float, float, float]:
 def _enforce_document_return(cy: str) -> str:
     """Si hay exactamente un alias de :Documento, fuerza RETURN DISTINCT <alias>.id AS id, <alias>.titulo AS titulo."""
     try:
-        aliases = re.findall(r"\(\s*([a-zA-Z]\w*)\s*:\s*Documento\b", cy)
+        aliases = _RE_DOC_ALIAS.findall(cy)
         aliases = [a for a in aliases if a]
         aliases = list(dict.fromkeys(aliases))  # únicos
         if len(aliases) != 1:
             return cy
         a = aliases[0]
         # Sustituir RETURN por el estándar y ORDER BY por titulo
-        cy2 = re.sub(r"(?is)\bRETURN\b[\s\S]*?(?=$)", f"RETURN DISTINCT {a}.id AS id, {a}.titulo AS titulo", cy.strip())
-        if re.search(r"(?i)\bORDER\s+BY\b", cy2):
-            cy2 = re.sub(r"(?i)\bORDER\s+BY\b[\s\S]*?(?=$)", "ORDER BY titulo", cy2)
+        cy2 = _RE_RETURN_TAIL.sub(f"RETURN DISTINCT {a}.id AS id, {a}.titulo AS titulo", cy.strip())
+        if _RE_ORDER_BY.search(cy2):
+            cy2 = _RE_ORDER_BY_TAIL.sub("ORDER BY titulo", cy2)
         else:
             cy2 += "\nORDER BY titulo"
         return cy2
@@ -350,16 +568,71 @@ def _enforce_document_return(cy: str) -> str:
 
 
 # ------------------------ Rescue policy para gpt_fb --------------------------
+def _disk_cache_put(path: Path, out) -> None:
+    """Escritura atómica (temporal + os.replace); si falla o no es serializable, se omite."""
+    try:
+        data = pickle.dumps(out, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return  # p. ej. columnas con nodos/relaciones de py2neo
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        NEO4J_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+    except Exception:
+        try:
+            tmp.unlink()
+        except Exception:
+            pass  # la caché nunca debe romper la evaluación
+
+@functools.lru_cache(maxsize=4096)
+def _run_df(cy: str) -> tuple[pd.DataFrame, int, bool]:
+    """
+    Ejecuta el Cypher (solo lectura) y devuelve (df, ms, cached).
+    Cacheado por texto de la query: motores que generan el mismo Cypher no
+    repiten el viaje a Neo4j y comparten los ms de la ejecución real. Con
+    EVAL_CACHE=1 también persiste en disco entre ejecuciones; lo leído de disco
+    lleva cached=True porque sus ms son de otra ejecución.
+    """
+    path = NEO4J_CACHE_DIR / (hashlib.sha1(cy.encode("utf-8")).hexdigest() + ".pkl")
+    use_disk = os.environ.get("EVAL_CACHE") == "1"
+    if use_disk and path.exists():
+        try:
+            with open(path, "rb") as f:
+                df, ms = pickle.load(f)
+            return df, ms, True
+        except Exception:
+            pass  # entrada corrupta: se recalcula
+    import pandas as pd
+    from utils.graph_client import run_cypher
+
+    t0 = time.time()
+    df = run_cypher(cy).to_data_frame()
+    out = (pd.DataFrame() if df is None else df, int((time.time() - t0) * 1000))
+    if use_disk:
+        _disk_cache_put(path, out)
+    return out[0], out[1], False
+
 def _quick_count(cy: str) -> int:
     """Ejecuta y devuelve len(df). Si falla, -1."""
     try:
-        df = run_cypher(cy).to_data_frame()
-        return 0 if df is None else len(df)
+        return len(_run_df(cy)[0])
     except Exception:
         return -1
 
 
 # ------------------------ Pipeline de evaluación ----------------------------
+# Reglas y fallbacks son funciones puras de la pregunta: se calculan una vez
+# por pregunta normalizada aunque la pidan varios motores (y el rescate gpt_fb).
+@functools.lru_cache(maxsize=4096)
+def _cached_rules_gen(qn: str) -> str:
+    return rules_gen(qn)
+
+@functools.lru_cache(maxsize=4096)
+def _cached_fb(qn: str) -> str | None:
+    return _fallback_from_question(qn)
+
 def generate_cypher(question: str, engine: str, model: str | None) -> tuple[str, bool]:
     """
     engine ∈ {'rules','rules_fb','gpt','gpt_fb'}
@@ -368,13 +641,13 @@ def generate_cypher(question: str, engine: str, model: str | None) -> tuple[str,
     fb_used = False
     cy = None
     if engine.startswith("rules"):
-        cy = rules_gen(question)
+        cy = _cached_rules_gen(_q_norm(question))
     elif engine.startswith("gpt"):
         cy = gpt_nl2cypher(question, model_hint=model)
 
     if (not cy) or cy == "FALLBACK":
         if engine.endswith("_fb"):
-            fb = _fallback_from_question(question)
+            fb = _cached_fb(_q_norm(question))
             if fb:
                 cy = fb
                 fb_used = True
@@ -391,7 +664,7 @@ def generate_cypher(question: str, engine: str, model: str | None) -> tuple[str,
     if engine == "gpt_fb":
         n_gpt = _quick_count(cy)
         if n_gpt <= 1:
-            cy_rules = rules_gen(question)
+            cy_rules = _cached_rules_gen(_q_norm(question))
             cy_rules = _fix_label_props_to_alias(_normalize_return(cy_rules))
             if is_safe_cypher(cy_rules):
                 n_rules = _quick_count(cy_rules)
@@ -404,6 +677,46 @@ def generate_cypher(question: str, engine: str, model: str | None) -> tuple[str,
         return "", fb_used
     return cy, fb_used
 
+def _eval_engine(qid, question: str, has_gold: bool, gold_ids: set[str], eng: str, model: str | None, ts: str) -> dict:
+    rec = {
+        "ts": ts,
+        "qid": qid,
+        "question": question,
+        "engine": eng,
+        "model": model if eng.startswith("gpt") else None,
+        "fallback_used": False,
+        "status": "error",
+        "precision": None,
+        "recall": None,
+        "f1": None,
+        "rows": 0,
+        "ms": None,
+        "cached": False,
+        "cypher": "",
+        "error": None,
+    }
+    cy, fb_used = generate_cypher(question, eng, model)
+    rec["fallback_used"] = fb_used
+    rec["cypher"] = cy
+    if not cy:
+        rec["error"] = "no_cypher"
+        return rec
+
+    try:
+        df, ms, cached = _run_df(cy)  # df compartido: no se modifica
+        rec["ms"] = ms
+        rec["cached"] = cached
+        rec["rows"] = len(df)
+        pred_ids = extract_ids(df)
+        pred_ids = set(map(str.lower, pred_ids))
+        if has_gold:
+            p, r, f1 = prf(pred_ids, gold_ids)
+            rec["precision"], rec["recall"], rec["f1"] = p, r, f1
+        rec["status"] = "ok"
+    except Exception as e:
+        rec["error"] = str(e)
+    return rec
+
 def run_eval_row(row, engines: list[str], model: str | None):
     qid = row.get("qid", None)
     question = str(row["question"]).strip()
@@ -415,60 +728,44 @@ def run_eval_row(row, engines: list[str], model: str | None):
     gold_ids = set([s.strip() for s in gt_payload.split("|") if s.strip()]) if has_gold else set()
     gold_ids = set(map(str.lower, gold_ids))
 
-    outputs = []
-    for eng in engines:
-        rec = {
-            "ts": datetime.utcnow().isoformat() + "Z",
-            "qid": qid,
-            "question": question,
-            "engine": eng,
-            "model": model if eng.startswith("gpt") else None,
-            "fallback_used": False,
-            "status": "error",
-            "precision": None,
-            "recall": None,
-            "f1": None,
-            "rows": 0,
-            "ms": None,
-            "cypher": "",
-            "error": None,
-        }
-        cy, fb_used = generate_cypher(question, eng, model)
-        rec["fallback_used"] = fb_used
-        rec["cypher"] = cy
-        if not cy:
-            rec["error"] = "no_cypher"
-            outputs.append(rec)
-            continue
+    # un único timestamp (resolución de segundos) para todos los motores de la fila
+    ts = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+    # motores en serie: rules/rules_fb y gpt/gpt_fb comparten generación y
+    # consultas vía lru_cache, y en paralelo ambos fallarían la caché a la vez
+    # (el paralelismo va entre preguntas, en main)
+    return [_eval_engine(qid, question, has_gold, gold_ids, eng, model, ts) for eng in engines]
 
-        t0 = time.time()
-        try:
-            df = run_cypher(cy).to_data_frame()
-            ms = int((time.time() - t0) * 1000)
-            rec["ms"] = ms
-            rec["rows"] = 0 if df is None else len(df)
-            pred_ids = extract_ids(df)
-            pred_ids = set(map(str.lower, pred_ids))
-            if has_gold:
-                p, r, f1 = prf(pred_ids, gold_ids)
-                rec["precision"], rec["recall"], rec["f1"] = p, r, f1
-            rec["status"] = "ok"
-        except Exception as e:
-            rec["error"] = str(e)
-        outputs.append(rec)
-    return outputs
 
+SUMMARY_FIELDS = ["engine", "status", "fallback_used", "f1", "ms", "cached", "rows"]
+
+def _jsonl_line(rec: dict) -> bytes:
+    """Una línea JSONL en UTF-8 (orjson si está instalado, si no json)."""
+    if orjson is not None:
+        return orjson.dumps(rec, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--data", type=str, default=str(DATA_CSV), help="CSV de preguntas (qid,question,gt_type,gt_payload,notes)")
     ap.add_argument("--engines", nargs="+", default=["rules","rules_fb","gpt","gpt_fb"],
                     help="Motores a evaluar (rules, rules_fb, gpt, gpt_fb)")
-    ap.add_argument("--model", type=str, default=(st.secrets.get("OPENAI_MODEL") or "gpt-4o-mini"),
-                    help="Modelo GPT si se usan motores gpt/gpt_fb")
+    ap.add_argument("--model", type=str, default=None,
+                    help="Modelo GPT si se usan motores gpt/gpt_fb (por defecto OPENAI_MODEL o gpt-4o-mini)")
     ap.add_argument("--limit", type=int, default=0, help="Evalúa solo N preguntas (>0); 0 = todas")
+    ap.add_argument("--workers", type=int, default=8,
+                    help="Hilos para evaluar preguntas en paralelo (1 = secuencial)")
+    ap.add_argument("--gpt-cache", choices=["off", "exact", "semantic"], default="exact",
+                    help="Caché de respuestas GPT en results/.gpt_cache.jsonl (semantic = + similitud de embeddings)")
     args = ap.parse_args()
 
+    global GPT_CACHE_MODE
+    GPT_CACHE_MODE = args.gpt_cache
+    args.model = args.model or _get_secret("OPENAI_MODEL") or "gpt-4o-mini"
+
+    import pandas as pd
+    from utils.graph_client import get_graph
+
     # Warm-up graph (asegura esquema)
     get_graph()
 
@@ -476,34 +773,57 @@ def main():
     if args.limit and args.limit > 0:
         dfq = dfq.head(args.limit)
 
-    all_rows = []
-    for _, row in dfq.iterrows():
-        outs = run_eval_row(row, args.engines, args.model)
-        all_rows.extend(outs)
+    rows = [row for _, row in dfq.iterrows()]
+    workers = max(1, args.workers)
+
+    def _eval(row):
+        return run_eval_row(row, args.engines, args.model)
 
-    # Guarda JSONL
-    with open(RESULTS_JSONL, "w", encoding="utf-8") as f:
-        for r in all_rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    # JSONL en streaming: cada fila se escribe (y se vuelca) según termina; en
+    # memoria solo quedan las columnas que necesita el resumen.
+    summary_rows = []
+
+    def _emit(outs, f):
+        for r in outs:
+            f.write(_jsonl_line(r))
+            summary_rows.append({k: r[k] for k in SUMMARY_FIELDS})
+        f.flush()
+
+    with open(RESULTS_JSONL, "wb") as f:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as ex:
+                for outs in ex.map(_eval, rows):  # mismo orden que el CSV
+                    _emit(outs, f)
+        else:
+            for row in rows:
+                _emit(_eval(row), f)
 
-    dfr = pd.DataFrame(all_rows)
+    dfr = pd.DataFrame(summary_rows, columns=SUMMARY_FIELDS)
     # Resumen por motor
     if not dfr.empty:
-        def _q95(s):
-            try: return float(pd.Series(s).quantile(0.95))
-            except: return None
-
-        grp = dfr.groupby("engine", dropna=False).agg(
-            n=("status","count"),
-            ok=("status", lambda s: int((s=="ok").sum())),
-            error=("status", lambda s: int((s=="error").sum())),
-            fallback=("fallback_used", lambda s: int(s.sum())),
+        dfr["is_ok"] = (dfr["status"] == "ok").astype(int)
+        dfr["is_err"] = (dfr["status"] == "error").astype(int)
+        dfr["fallback_used"] = dfr["fallback_used"].astype(bool).astype(int)
+        dfr["cached"] = dfr["cached"].astype(bool).astype(int)
+        for c in ("f1", "ms", "rows"):
+            dfr[c] = pd.to_numeric(dfr[c], errors="coerce")
+        # latencias solo de ejecuciones de esta corrida (las de la caché en disco no cuentan)
+        dfr.loc[dfr["cached"] == 1, "ms"] = float("nan")
+
+        by = dfr.groupby("engine", dropna=False)
+        grp = by.agg(
+            n=("status","size"),
+            ok=("is_ok","sum"),
+            error=("is_err","sum"),
+            fallback=("fallback_used","sum"),
+            cached=("cached","sum"),
             f1_avg=("f1","mean"),
             f1_median=("f1","median"),
-            ms_p50=("ms", lambda s: float(pd.Series(s).median(skipna=True))),
-            ms_p95=("ms", _q95),
+            ms_p50=("ms","median"),
             rows_avg=("rows","mean"),
-        ).reset_index()
+        )
+        grp.insert(grp.columns.get_loc("ms_p50") + 1, "ms_p95", by["ms"].quantile(0.95))
+        grp = grp.reset_index()
         grp["ok_rate"] = grp["ok"] / grp["n"]
         grp.to_csv(SUMMARY_CSV, index=False)
         print("\n=== Resumen por motor ===")
@@ -1,17 +1,26 @@
 # tools/ingest_articles.py
+from __future__ import annotations
 from pathlib import Path
-import re, os
+import io, re, os, sys
+from operator import itemgetter
+from multiprocessing import Pool
+from typing import TYPE_CHECKING
 try:
     import tomllib as toml  # Py 3.11+
 except ModuleNotFoundError:
     import tomli as toml    # Py <=3.10
 
-import fitz
-from py2neo import Graph
+# fitz (PyMuPDF) y py2neo se importan donde se usan: arranque más rápido, y los
+# procesos del pool de extracción no cargan py2neo.
+if TYPE_CHECKING:
+    from py2neo import Graph
 
 ROOT = Path(__file__).resolve().parents[1]
 SECRETS_PATH = ROOT / ".streamlit" / "secrets.toml"
 PDF_DIR = ROOT / "data" / "pdfs"
+sys.path.append(str(ROOT))  # añade raíz del proyecto al PYTHONPATH
+
+from utils.articles import numero_int  # noqa
 
 HINT_OVERRIDES = {
     "boe-a-2018-16673": "lo-3-2018",
@@ -26,45 +35,65 @@ ARTICLE_RE = re.compile(
     r'(?mi)^\s*(art(?:[íi]culo|\.)\s*(\d+(?:\s*(?:bis|ter|quater|quinquies|sexies))?))'
     r'(?:\s*[-–—.:]\s*(.*)|\s*$)'
 )
+HYPHEN_BREAK_RE = re.compile(r'(\w)-\n(\w)')
+ARTICLE_BREAK_RE = re.compile(r'(?mi)(art(?:[íi]culo|\.)\s*)\n\s*(\d+[a-z]?)')
+HSPACE_RE = re.compile(r"[ \t]+")
 
 def normalize_text(s: str) -> str:
     s = s.replace(SOFT_HYPHEN, "").replace(NBSP, " ")
-    s = re.sub(r'(\w)-\n(\w)', r'\1\2', s)
-    s = re.sub(r'(?mi)(art(?:[íi]culo|\.)\s*)\n\s*(\d+[a-z]?)', r'\1 \2', s)
-    s = re.sub(r"[ \t]+", " ", s)
+    s = HYPHEN_BREAK_RE.sub(r'\1\2', s)
+    s = ARTICLE_BREAK_RE.sub(r'\1 \2', s)
+    s = HSPACE_RE.sub(" ", s)
     return s
 
+_BLOCK_ORDER = itemgetter(1, 0)  # (y0, x0): orden de lectura, comparador en C
+
+def iter_pdf_pages(pdf_path: Path, mode: str = "text"):
+    """Texto de cada página, de una en una; el documento se cierra al terminar."""
+    import fitz
+    with fitz.open(pdf_path.as_posix()) as doc:
+        for p in doc:
+            if mode == "blocks":
+                blocks = p.get_text("blocks")
+                blocks.sort(key=_BLOCK_ORDER)
+                yield "\n".join(b[4] for b in blocks if b[4].strip())
+            else:
+                yield p.get_text("text")
+
 def load_pdf_text(pdf_path: Path, mode: str = "text") -> str:
-    doc = fitz.open(pdf_path.as_posix())
-    pages = []
-    for p in doc:
-        if mode == "blocks":
-            blocks = p.get_text("blocks")
-            blocks.sort(key=lambda b: (b[1], b[0]))
-            page_text = "\n".join(b[4] for b in blocks if b[4].strip())
-        else:
-            page_text = p.get_text("text")
-        pages.append(page_text)
-    return normalize_text("\n".join(pages))
+    buf = io.StringIO()
+    for i, page_text in enumerate(iter_pdf_pages(pdf_path, mode)):
+        if i:
+            buf.write("\n")
+        buf.write(page_text)
+    # normalización sobre el texto completo: hay cortes de guion/artículo entre páginas
+    return normalize_text(buf.getvalue())
 
 def split_articles(full_text: str):
-    lines = full_text.splitlines()
-    anchors = []
-    for i, line in enumerate(lines):
+    # recorrido línea a línea: solo se guarda el cuerpo del artículo en curso.
+    # splitlines() corta también en \f (saltos de página del PDF), \v, \x85...
+    arts = []
+    cur, body = None, []
+    for line in full_text.splitlines():
         m = ARTICLE_RE.match(line)
         if m:
-            anchors.append((i, m.group(2).strip(), (m.group(3) or "").strip() or "(sin título)"))
-    arts = []
-    for idx, (start_i, numero, titulo) in enumerate(anchors):
-        end_i = anchors[idx+1][0] if idx+1 < len(anchors) else len(lines)
-        cuerpo = "\n".join(lines[start_i+1:end_i]).strip()
-        arts.append({"numero": numero, "titulo": titulo, "texto": cuerpo})
+            if cur is not None:
+                cur["texto"] = "\n".join(body).strip()
+                arts.append(cur)
+            cur = {"numero": m.group(2).strip(), "titulo": (m.group(3) or "").strip() or "(sin título)"}
+            body = []
+        elif cur is not None:
+            body.append(line)
+    if cur is not None:
+        cur["texto"] = "\n".join(body).strip()
+        arts.append(cur)
     return arts
 
 def stem_to_hint(stem: str) -> str:
     return HINT_OVERRIDES.get(stem.lower(), stem.lower())
 
 def load_graph() -> Graph:
+    from py2neo import Graph
     if SECRETS_PATH.exists():
         with open(SECRETS_PATH, "rb") as f:
             s = toml.load(f)
@@ -75,6 +104,11 @@ def load_graph() -> Graph:
         raise RuntimeError("Faltan credenciales de Neo4j.")
     return Graph(uri, auth=(user, pwd))
 
+def ensure_article_index(graph: Graph) -> None:
+    """Índices por número de artículo: el MERGE del upsert y las consultas por numero_int."""
+    graph.run("CREATE INDEX IF NOT EXISTS FOR (a:Articulo) ON (a.numero)").consume()
+    graph.run("CREATE INDEX art_numero_int IF NOT EXISTS FOR (a:Articulo) ON (a.numero_int)").consume()
+
 def find_document_node(graph: Graph, hint: str):
     return graph.evaluate("""
         MATCH (d:Documento)
@@ -83,48 +117,45 @@ def find_document_node(graph: Graph, hint: str):
         RETURN d LIMIT 1
     """, h=hint.lower())
 
-def upsert_articles_for_document(graph: Graph, doc_hint: str, pdf_path: Path):
+def extract_articles(pdf_path: Path):
+    """Parte CPU (PyMuPDF + regex) de un PDF; se ejecuta en los procesos del pool."""
+    doc_hint = stem_to_hint(pdf_path.stem)
+    mode = "blocks" if "reglamento-ue-2016-679" in doc_hint or "celex_32016r0679" in pdf_path.stem.lower() else "text"
+    return pdf_path, doc_hint, split_articles(load_pdf_text(pdf_path, mode=mode))
+
+def upsert_articles_for_document(graph: Graph, doc_hint: str, pdf_path: Path, arts=None):
     d = find_document_node(graph, doc_hint)
     if not d:
         print(f"[WARN] No encontré :Documento para hint='{doc_hint}' (file={pdf_path.name})")
         return
-    mode = "blocks" if "reglamento-ue-2016-679" in doc_hint or "celex_32016r0679" in pdf_path.stem.lower() else "text"
-    text = load_pdf_text(pdf_path, mode=mode)
-    arts = split_articles(text)
+    if arts is None:
+        arts = extract_articles(pdf_path)[2]
     if not arts:
         print(f"[INFO] 0 artículos detectados en {pdf_path.name}.")
         return
     print(f"[OK]   {pdf_path.name}: {len(arts)} artículos → {doc_hint}")
 
-    tx = graph.begin()
-    for art in arts:
-        exists = tx.evaluate("""
-            MATCH (d:Documento)-[:TIENE_ARTICULO]->(a:Articulo {numero:$n})
-            WHERE id(d)=$doc_id RETURN a
-        """, n=art["numero"], doc_id=d.identity)
-        if exists:
-            tx.run("""
-                MATCH (d:Documento)-[:TIENE_ARTICULO]->(a:Articulo {numero:$n})
-                WHERE id(d)=$doc_id
-                SET a.titulo=$t, a.texto=$x
-            """, n=art["numero"], t=art["titulo"], x=art["texto"], doc_id=d.identity)
-        else:
-            tx.run("""
-                MATCH (d:Documento) WHERE id(d)=$doc_id
-                MERGE (d)-[:TIENE_ARTICULO]->(a:Articulo {numero:$n})
-                ON CREATE SET a.titulo=$t, a.texto=$x
-            """, doc_id=d.identity, n=art["numero"], t=art["titulo"], x=art["texto"])
-    graph.commit(tx)
+    # un único statement: UNWIND + MERGE (1 round trip en lugar de 2 por artículo)
+    rows = [{"n": a["numero"], "ni": numero_int(a["numero"]), "t": a["titulo"], "x": a["texto"]}
+            for a in arts]
+    graph.run("""
+        MATCH (d:Documento) WHERE id(d)=$doc_id
+        UNWIND $rows AS r
+        MERGE (d)-[:TIENE_ARTICULO]->(a:Articulo {numero:r.n})
+        SET a.numero_int=r.ni, a.titulo=r.t, a.texto=r.x
+    """, doc_id=d.identity, rows=rows).consume()
     print(f"[DONE] {pdf_path.name}: carga/actualización completada.")
 
 if __name__ == "__main__":
     graph = load_graph()
+    ensure_article_index(graph)
     if not PDF_DIR.exists():
         print(f"[ERROR] No existe el directorio de PDFs: {PDF_DIR}"); raise SystemExit(1)
     pdfs = sorted(PDF_DIR.glob("*.pdf"))
     if not pdfs:
         print(f"[ERROR] No se encontraron PDFs en {PDF_DIR}"); raise SystemExit(1)
     print(f"[INFO] Procesando {len(pdfs)} PDFs de {PDF_DIR} ...")
-    for pdf in pdfs:
-        hint = stem_to_hint(pdf.stem)
-        upsert_articles_for_document(graph, hint, pdf)
+    # extracción en paralelo (un PDF por proceso); escrituras en Neo4j en serie
+    with Pool(processes=min(len(pdfs), os.cpu_count() or 1)) as pool:
+        for pdf, hint, arts in pool.imap_unordered(extract_articles, pdfs):
+            upsert_articles_for_document(graph, hint, pdf, arts)
@@ -0,0 +1,15 @@
+# app/utils/articles.py
+from __future__ import annotations
+import re
+
+_RE_NUM_INT = re.compile(r"\d+")
+
+
+def numero_int(numero) -> int | None:
+    """
+    Parte numérica del número de artículo ("5", "5a", "5 bis" → 5) para
+    a.numero_int (índice art_numero_int). Única implementación: todas las rutas
+    de ingesta deben dar el mismo valor para el mismo número.
+    """
+    m = _RE_NUM_INT.search("" if numero is None else str(numero))
+    return int(m.group(0)) if m else None
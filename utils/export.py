@@ -0,0 +1,46 @@
+# app/utils/export.py
+from __future__ import annotations
+import io
+import os
+import re
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pa_compute
+    import pyarrow.csv as pa_csv
+except Exception:  # pyarrow llega con streamlit, pero no rompemos si falta
+    pa = None
+
+_CSV_SPECIAL = r'[,"\r\n]'  # lo que pandas entrecomillaría
+
+
+def _arrow_safe(col) -> bool:
+    """Enteros, o texto sin nada que entrecomillar (bool/float/fechas salen distinto)."""
+    if pa.types.is_integer(col.type):
+        return True
+    return pa.types.is_string(col.type) and not pa_compute.any(
+        pa_compute.match_substring_regex(col, _CSV_SPECIAL)).as_py()
+
+
+def to_csv_bytes(df: pd.DataFrame) -> bytes:
+    """
+    Serializa un DataFrame a CSV (UTF-8, sin índice) para st.download_button.
+    Usa el escritor de Arrow (C++) solo cuando da los mismos bytes que
+    df.to_csv(index=False): fin de línea "\\n", 2+ columnas (con una sola, pandas
+    entrecomilla las celdas vacías) y todas ellas seguras según _arrow_safe.
+    """
+    names = list(df.columns)
+    if (pa is not None and os.linesep == "\n" and len(names) > 1
+            and all(isinstance(c, str) and not re.search(_CSV_SPECIAL, c) for c in names)):
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if all(_arrow_safe(col) for col in table.columns):
+                buf = io.BytesIO()
+                buf.write((",".join(names) + "\n").encode("utf-8"))  # cabecera sin comillas, como pandas
+                pa_csv.write_csv(table, buf, pa_csv.WriteOptions(include_header=False, quoting_style="none"))
+                return buf.getvalue()
+        except Exception:
+            pass
+    return df.to_csv(index=False).encode("utf-8")
@@ -6,15 +6,20 @@ Mejoras clave:
 - Auto-esquema idempotente: constraints + índices + full-text (doc/tema/artículo)
 - Detección de TLS por esquema (bolt+s / bolt+ssc / neo4j+s / neo4j+ssc)
 - Conexión cacheada (Streamlit) con smoke-test y reconexión automática
-- API práctica: run(), run_cypher(), run_data(), evaluate(), get_graph()
+- API práctica: run(), run_cypher(), run_records(), run_data(), run_data_cached(),
+  evaluate(), get_graph()
 - Tolerante a Neo4j 4.x/5.x para full-text (DDL / procedimiento)
 
 Lee credenciales de st.secrets o del entorno:
   NEO4J_URI, NEO4J_USER, NEO4J_PASS | NEO4J_PASSWORD
 """
 from __future__ import annotations
+import functools
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import random
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import streamlit as st
 from py2neo import Graph
@@ -23,6 +28,16 @@ try:
     from py2neo.wiring import BrokenWireError  # py2neo 2021+
 except Exception:  # compat fallback
     class BrokenWireError(Exception): ...
+try:
+    from py2neo.errors import TransientError  # deadlocks, líder no disponible…
+except Exception:  # compat fallback
+    class TransientError(Exception): ...
+
+# Reintentos de run() ante cortes de Aura / errores transitorios (backoff exponencial)
+try:
+    NEO4J_MAX_RETRIES = max(0, int(os.getenv("NEO4J_MAX_RETRIES", "3") or 3))
+except ValueError:  # valor no numérico: no rompemos el import
+    NEO4J_MAX_RETRIES = 3
 
 # -------------------------------------------------------------------
 # Credenciales y TLS
@@ -42,6 +57,13 @@ def _read_creds() -> Tuple[str, str, str]:
     return uri, user, password
 
 
+@functools.lru_cache(maxsize=1)
+def _creds() -> Tuple[str, str, str]:
+    """_read_creds() una sola vez por proceso: los secrets no cambian en caliente."""
+    return _read_creds()
+
+
+@functools.lru_cache(maxsize=8)
 def _parse_security(uri: str) -> Tuple[bool, bool]:
     """Devuelve (secure, verify) según el esquema (+s = TLS, +ssc = sin verificación)."""
     u = (uri or "").lower()
@@ -73,6 +95,7 @@ def _ensure_schema(g: Graph) -> None:
         "CREATE INDEX IF NOT EXISTS FOR (t:Tema)       ON (t.norm)",
         "CREATE INDEX IF NOT EXISTS FOR (e:Entidad)    ON (e.norm)",
         "CREATE INDEX IF NOT EXISTS FOR (a:Articulo)   ON (a.numero)",
+        "CREATE INDEX art_numero_int IF NOT EXISTS FOR (a:Articulo) ON (a.numero_int)",
     ]
     for q in base:
         _safe_run(g, q)
@@ -106,9 +129,10 @@ def _connect(uri: str, user: str, password: str) -> Graph:
     return g
 
 _cached_graph: Optional[Graph] = None
+_graph_lock = threading.Lock()  # protege la (re)creación de _cached_graph entre hilos
 
 def _new_graph() -> Graph:
-    uri, user, password = _read_creds()
+    uri, user, password = _creds()
     return _connect(uri, user, password)
 
 # -------------------------------------------------------------------
@@ -116,35 +140,64 @@ def _new_graph() -> Graph:
 # -------------------------------------------------------------------
 
 def get_graph(force_new: bool = False) -> Graph:
-    """Devuelve un Graph operativo; si está roto, reconecta."""
+    """
+    Devuelve el Graph cacheado (thread-safe). Validación perezosa: no se sondea
+    con RETURN 1; run() pide force_new=True solo cuando una query falla por
+    conexión rota.
+    """
     global _cached_graph
-    if force_new or _cached_graph is None:
-        _cached_graph = _new_graph()
-        return _cached_graph
-    try:
-        _cached_graph.run("RETURN 1").evaluate()
-        return _cached_graph
-    except (ConnectionBroken, BrokenWireError):
-        _cached_graph = _new_graph()
+    g = _cached_graph
+    if g is not None and not force_new:
+        return g
+    with _graph_lock:
+        # si otro hilo ya lo reemplazó mientras esperábamos, reutilizamos el suyo
+        if _cached_graph is None or _cached_graph is g:
+            if force_new:
+                _connect.clear()  # si no, cache_resource devolvería el mismo Graph roto
+            _cached_graph = _new_graph()
         return _cached_graph
 
 
 def run(query: str, parameters: Optional[Dict[str, Any]] = None):
-    """Ejecuta Cypher con reconexión automática. Retorna Cursor de py2neo."""
+    """
+    Ejecuta Cypher con reconexión automática. Retorna Cursor de py2neo.
+    Hasta NEO4J_MAX_RETRIES reintentos con backoff exponencial y jitter
+    (50 ms, 100 ms, 200 ms… tope 0,5 s); solo se reconecta si se rompió la conexión.
+    """
+    params = parameters or {}
     g = get_graph()
-    try:
-        return g.run(query, parameters=parameters or {})
-    except (ConnectionBroken, BrokenWireError):
-        g = get_graph(force_new=True)
-        return g.run(query, parameters=parameters or {})
+    for attempt in range(NEO4J_MAX_RETRIES + 1):
+        try:
+            return g.run(query, parameters=params)
+        except (ConnectionBroken, BrokenWireError, TransientError) as e:
+            if attempt >= NEO4J_MAX_RETRIES:
+                raise
+            time.sleep(min(0.05 * 2 ** attempt + random.uniform(0, 0.01), 0.5))
+            if not isinstance(e, TransientError):
+                g = get_graph(force_new=True)
 
 # ✅ Alias retro-compatible para tu página: mantiene import run_cypher
 def run_cypher(query: str, parameters: Optional[Dict[str, Any]] = None):
     return run(query, parameters)
 
+def run_records(query: str, parameters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Ejecuta Cypher y entrega cada fila como dict a medida que se consume: no
+    materializa el resultado completo (memoria acotada, primera fila antes).
+    """
+    return (dict(r) for r in run(query, parameters))
+
 def run_data(query: str, parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
-    """Ejecuta Cypher y devuelve data() (lista de dicts)."""
-    return run(query, parameters).data()
+    """Ejecuta Cypher y devuelve una lista de dicts (compatibilidad; ver run_records)."""
+    return list(run_records(query, parameters))
+
+@st.cache_data(ttl=300, show_spinner=False)
+def run_data_cached(query: str, parameters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    run_data() con caché de resultados (5 min) por (query, parameters): solo para
+    lecturas idempotentes; las escrituras deben seguir usando run()/run_data().
+    """
+    return run_data(query, parameters)
 
 def evaluate(query: str, parameters: Optional[Dict[str, Any]] = None):
     """Ejecuta Cypher y devuelve evaluate()."""
@@ -1,75 +1,121 @@
 # app/utils/ingest_from_pdf.py
 from __future__ import annotations
 import re
-from typing import List, Dict, Any, Tuple
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 import fitz  # PyMuPDF
 from py2neo import Graph
 
+from utils.articles import numero_int
+
 SOFT_HYPHEN = "\u00ad"
 NBSP = "\u00a0"
 ARTICLE_RE = re.compile(
     r'(?mi)^\s*(art(?:[íi]culo|\.)\s*(\d+(?:\s*(?:bis|ter|quater|quinquies|sexies))?))'
     r'(?:\s*[-–—.:]\s*(.*)|\s*$)'
 )
+# Misma regex para finditer sobre texto con saltos de línea: los \s no pueden
+# cruzar un "\n", así cada acierto queda dentro de una línea (como con .match).
+ARTICLE_LINE_RE = re.compile(ARTICLE_RE.pattern.replace(r"\s", r"[^\S\n]"))
+
+# Sustituciones de un carácter en una sola pasada (str.translate) y dos regex
+# precompiladas, en vez de cuatro re.sub y varios .replace encadenados.
+_NORMALIZE_TABLE = str.maketrans({SOFT_HYPHEN: "", NBSP: " ", "\r": " ", "\t": " "})
+_RE_WS = re.compile(r"\s+")
+_RE_SPACE_PUNCT = re.compile(r" ([.,])")
 
 def _normalize_text(s: str) -> str:
-    s = s.replace(SOFT_HYPHEN, "").replace(NBSP, " ")
-    # normalizamos guiones y espacios "raros"
-    s = re.sub(r"[\r\t]+", " ", s)
-    s = re.sub(r"\s+\n", "\n", s)
-    s = re.sub(r"\n\s+", "\n", s)
-    s = re.sub(r"\s+", " ", s)
-    # mantenemos saltos de línea para segmentar artículos
-    s = s.replace(" .", ".").replace(" ,", ",")
-    return s
+    s = s.translate(_NORMALIZE_TABLE)
+    # cualquier racha de espacios (saltos de línea incluidos) queda en uno solo
+    s = _RE_WS.sub(" ", s)
+    return _RE_SPACE_PUNCT.sub(r"\1", s)
+
+_BLOCK_ORDER = itemgetter(1, 0)  # (y0, x0): orden de lectura, comparador en C
 
-def _pdf_to_text(pdf_bytes: bytes, mode: str = "text") -> str:
+def _iter_pages(pdf_bytes: bytes, mode: str = "text") -> Iterator[str]:
     with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        pages = []
         for p in doc:
             if mode == "blocks":
                 blocks = p.get_text("blocks")
-                blocks.sort(key=lambda b: (b[1], b[0]))
-                page_text = "\n".join(b[4] for b in blocks if b[4].strip())
+                blocks.sort(key=_BLOCK_ORDER)
+                yield "\n".join(b[4] for b in blocks if b[4].strip())
             else:
-                page_text = p.get_text("text")
-            pages.append(page_text)
-    # Usamos saltos de línea para que ARTICLE_RE funcione
-    return "\n".join(pages)
+                yield p.get_text("text")
 
-def _split_articles(full_text: str) -> List[Dict[str, Any]]:
-    lines = full_text.splitlines()
-    anchors = []
-    for i, line in enumerate(lines):
-        m = ARTICLE_RE.match(line)
-        if m:
+def _split_articles(pages: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Una pasada de ARTICLE_LINE_RE.finditer por página (en C) en lugar de un
+    .match por línea. Las páginas se unen con "\n"; el cuerpo de cada artículo
+    es el texto entre el final de su línea y el inicio del siguiente artículo.
+    """
+    if isinstance(pages, str):
+        pages = (pages,)
+    arts: List[Dict[str, Any]] = []
+    cur: Dict[str, Any] | None = None
+    body: List[str] = []
+    for i, page in enumerate(pages):
+        if i and cur is not None:
+            body.append("\n")
+        pos = 0
+        for m in ARTICLE_LINE_RE.finditer(page):
+            if cur is not None:
+                body.append(page[pos:m.start()])
+                cur["texto"] = "".join(body).strip()
+                arts.append(cur)
             numero = m.group(2).strip()
             titulo = (m.group(3) or "").strip() or "(sin título)"
-            anchors.append((i, numero, titulo))
-    arts: List[Dict[str, Any]] = []
-    for idx, (start_i, numero, titulo) in enumerate(anchors):
-        end_i = anchors[idx+1][0] if idx+1 < len(anchors) else len(lines)
-        cuerpo = "\n".join(lines[start_i+1:end_i]).strip()
-        arts.append({"numero": numero, "titulo": titulo, "texto": cuerpo})
+            cur, body, pos = {"numero": numero, "titulo": titulo}, [], m.end()
+        if cur is not None:
+            body.append(page[pos:])
+    if cur is not None:
+        cur["texto"] = "".join(body).strip()
+        arts.append(cur)
     return arts
 
 def parse_articles_from_bytes(pdf_bytes: bytes, mode: str = "text") -> List[Dict[str, Any]]:
-    text = _pdf_to_text(pdf_bytes, mode=mode)
-    return _split_articles(text)
+    return _split_articles(_iter_pages(pdf_bytes, mode=mode))
+
+UPSERT_BATCH = 500  # filas por transacción
+
+# existencia previa + MERGE + SET para un lote de artículos de un documento
+_UPSERT_ARTICLES = """
+MATCH (d:Documento {id:$doc_id})
+UNWIND $rows AS r
+OPTIONAL MATCH (d)-[:TIENE_ARTICULO]->(old:Articulo {id:r.aid})
+WITH d, r, old IS NULL AS is_new
+MERGE (d)-[:TIENE_ARTICULO]->(a:Articulo {id:r.aid})
+SET a.numero=r.n, a.numero_int=r.ni, a.titulo=r.t, a.texto=r.x
+RETURN sum(CASE WHEN is_new THEN 1 ELSE 0 END) AS created
+"""
+
+_DOC_HINT_MATCH = """
+WHERE toLower(d.id) CONTAINS $h
+   OR toLower(coalesce(d.norm, d.titulo)) CONTAINS replace($h,'-',' ')
+RETURN d LIMIT 1
+"""
+_FIND_DOC_FT = """
+CALL db.index.fulltext.queryNodes('doc_fulltext', $q) YIELD node AS d
+""" + _DOC_HINT_MATCH
+_FIND_DOC_SCAN = "MATCH (d:Documento)" + _DOC_HINT_MATCH
+_RE_LUCENE_PHRASE_UNSAFE = re.compile(r'["\\\-]')  # comillas, escapes y '-' (NOT en Lucene)
 
 def upsert_articles(graph: Graph, doc_hint: str, arts: List[Dict[str, Any]]) -> Tuple[int, int]:
-    d = graph.evaluate("""
-        MATCH (d:Documento)
-        WHERE toLower(d.id) CONTAINS $h
-           OR toLower(coalesce(d.norm, d.titulo)) CONTAINS replace($h,'-',' ')
-        RETURN d LIMIT 1
-    """, h=doc_hint.lower())
+    h = doc_hint.lower()
+    # candidatos por índice full-text; el mismo filtro CONTAINS decide, así que
+    # solo se recorre toda la etiqueta si el índice no devuelve nada válido
+    try:
+        d = graph.evaluate(_FIND_DOC_FT, h=h, q='"' + _RE_LUCENE_PHRASE_UNSAFE.sub(" ", h) + '"')
+    except Exception:
+        d = None  # índice aún no creado o frase vacía para Lucene
+    if not d:
+        d = graph.evaluate(_FIND_DOC_SCAN, h=h)
     if not d:
         raise ValueError(f"No se encontró :Documento que contenga «{doc_hint}» en id/titulo/norm.")
     doc_id = d["id"]
 
-    created = updated = 0
-    tx = graph.begin()
+    # filas deduplicadas por id de artículo (gana la última, como con el bucle
+    # anterior); los duplicados cuentan como actualizaciones
+    rows: Dict[str, Dict[str, str]] = {}
     for art in arts:
         n = (art.get("numero") or "").strip()
         t = (art.get("titulo") or "(sin título)").strip()
@@ -78,24 +124,11 @@ def upsert_articles(graph: Graph, doc_hint: str, arts: List[Dict[str, Any]]) ->
             # si no hay número, generamos uno incremental simple
             n = str(len(arts))
         aid = f"{doc_id}-art-{n}"
+        rows[aid] = {"aid": aid, "n": n, "ni": numero_int(n), "t": t, "x": x}
 
-        exists = tx.evaluate("""
-            MATCH (d:Documento {id:$doc_id})-[:TIENE_ARTICULO]->(a:Articulo {id:$aid})
-            RETURN a
-        """, doc_id=doc_id, aid=aid)
-
-        if exists:
-            tx.run("""
-                MATCH (d:Documento {id:$doc_id})-[:TIENE_ARTICULO]->(a:Articulo {id:$aid})
-                SET a.numero=$n, a.titulo=$t, a.texto=$x
-            """, doc_id=doc_id, aid=aid, n=n, t=t, x=x)
-            updated += 1
-        else:
-            tx.run("""
-                MATCH (d:Documento {id:$doc_id})
-                MERGE (d)-[:TIENE_ARTICULO]->(a:Articulo {id:$aid})
-                ON CREATE SET a.numero=$n, a.titulo=$t, a.texto=$x
-            """, doc_id=doc_id, aid=aid, n=n, t=t, x=x)
-            created += 1
-    graph.commit(tx)
-    return created, updated
+    # un round trip por lote de UPSERT_BATCH filas (transacciones acotadas en Aura)
+    batch = list(rows.values())
+    created = 0
+    for i in range(0, len(batch), UPSERT_BATCH):
+        created += int(graph.evaluate(_UPSERT_ARTICLES, doc_id=doc_id, rows=batch[i:i + UPSERT_BATCH]) or 0)
+    return created, len(arts) - created
@@ -1,10 +1,18 @@
 # app/utils/telemetry.py
 from __future__ import annotations
+import atexit
 import os
 import json
-from datetime import datetime
+import queue
+import threading
+import time
 from typing import Optional, Dict, Any
 
+try:
+    import orjson  # serialización en C (opcional)
+except Exception:
+    orjson = None
+
 # ---- Configuración ----------------------------------------------------------
 # Habilita/deshabilita telemetría sin tocar código.
 ENABLED = os.getenv("ENABLE_TELEMETRY", "1") not in {"0", "false", "False"}
@@ -26,16 +34,100 @@ def _ensure_dir(path: str) -> None:
         pass
 
 
+# ---- Escritor en segundo plano ------------------------------------------------
+# log_event solo encola; un hilo daemon serializa y escribe por lotes con un
+# único handle abierto por fichero. None en la cola = parar (al salir).
+_q: "queue.Queue[Optional[tuple[str, Dict[str, Any]]]]" = queue.Queue()
+
+
+def _dumps(record: Dict[str, Any]) -> bytes:
+    """Línea JSONL en UTF-8 (orjson si está instalado, si no json)."""
+    if orjson is not None:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _utc_ts() -> str:
+    """Marca UTC con sufijo Z a resolución de segundos (mismo formato que antes)."""
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+
+def _write_batch(files: Dict[str, Any], batch: list) -> None:
+    by_path: Dict[str, list] = {}
+    for path, record in batch:
+        try:
+            by_path.setdefault(path, []).append(_dumps(record))
+        except Exception:
+            pass  # registro no serializable: se descarta
+    for path, lines in by_path.items():
+        try:
+            f = files.get(path)
+            if f is None:
+                _ensure_dir(os.path.dirname(path) or ".")
+                f = files[path] = open(path, "ab", buffering=1 << 16)
+            f.write(b"".join(lines))
+            f.flush()
+        except Exception:
+            # No interrumpir el flujo por problemas de escritura
+            pass
+
+
+def _drain() -> None:
+    files: Dict[str, Any] = {}
+    stop = False
+    while not stop:
+        items = [_q.get()]
+        while True:
+            try:
+                items.append(_q.get_nowait())
+            except queue.Empty:
+                break
+        stop = None in items
+        _write_batch(files, [it for it in items if it is not None])
+        for _ in items:
+            _q.task_done()
+    for f in files.values():
+        try:
+            f.close()
+        except Exception:
+            pass
+
+
+# El hilo se arranca con el primer evento (no al importar): con la telemetría
+# deshabilitada, o si nunca se registra nada, no hay hilo ni atexit.
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None:
+        return
+    with _writer_lock:
+        if _writer is None:
+            t = threading.Thread(target=_drain, name="telemetry-writer", daemon=True)
+            t.start()
+            atexit.register(_shutdown)
+            _writer = t
+
+
+def _shutdown() -> None:
+    """Vacía la cola antes de salir (con límite, nunca bloquea el cierre)."""
+    _q.put(None)
+    if _writer is not None:
+        _writer.join(timeout=2.0)
+
+
 def _safe_append_jsonl(path: str, record: Dict[str, Any]) -> None:
     """
-    Escribe una línea JSON en `path`. Cualquier error se ignora silenciosamente
-    para no afectar a la app.
+    Encola una línea JSON para `path`; la escribe el hilo de telemetría.
+    Cualquier error se ignora silenciosamente para no afectar a la app.
+    Solo se llama tras comprobar ENABLED (log_event / log_simple).
     """
     try:
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        _ensure_writer()
+        _q.put_nowait((path, record))
     except Exception:
-        # No interrumpir el flujo por problemas de escritura
         pass
 
 
@@ -63,9 +155,8 @@ def log_event(
         return
 
     try:
-        _ensure_dir(LOG_DIR)
         rec = {
-            "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "ts": _utc_ts(),
             "type": event_type,
             "question": question,
             "engine": engine,
@@ -94,9 +185,8 @@ def log_simple(event: str, page: Optional[str] = None, metadata: Optional[Dict[s
         return
 
     try:
-        _ensure_dir(LOG_DIR)
         rec = {
-            "ts": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "ts": _utc_ts(),
             "event": event,
             "page": page,
             "metadata": metadata or {},
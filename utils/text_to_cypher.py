@@ -15,40 +15,81 @@ TFM R46 – Generador NL/Text → Cypher (versión final mejorada para Neo4j Aur
 """
 
 from __future__ import annotations
+import functools
 import re
 import unicodedata
-from typing import List, Tuple, Dict, Optional
+from itertools import chain
+from typing import Any, Iterable, Iterator, List, Tuple, Dict, Optional
 
 # ==============================================================
 # 🔧 Utilidades
 # ==============================================================
 
+_RE_WS = re.compile(r"\s+")
+
+@functools.lru_cache(maxsize=4096)
 def _norm(s: str) -> str:
-    """Normaliza texto: minúsculas, sin tildes ni dobles espacios."""
+    """Normaliza texto: minúsculas, sin tildes ni dobles espacios (cacheado)."""
     if not s:
         return ""
     s = s.lower()
     s = "".join(c for c in unicodedata.normalize("NFKD", s) if not unicodedata.combining(c))
     s = s.replace("-", " ")
-    return re.sub(r"\s+", " ", s).strip()
+    return _RE_WS.sub(" ", s).strip()
 
+@functools.lru_cache(maxsize=2048)
 def _esc(s: str) -> str:
-    """Escapa comillas simples para Cypher."""
+    """Escapa comillas simples para Cypher (cacheado: ids y temas se repiten)."""
     return s.replace("'", "\\'") if s else ""
 
-def _has_root(q: str, root: str) -> bool:
-    """Detecta raíces verbales para intents."""
-    qn = _norm(q)
-    if root == "modific":
-        return "modific" in qn or "modifi" in qn or bool(re.search(r"\bmodific\w*", qn))
-    if root == "mencion":
-        return "mencion" in qn or bool(re.search(r"\bmencion\w*", qn))
-    if root == "derog":
-        return "derog" in qn or bool(re.search(r"\bderog\w*", qn))
-    if root == "articul":
-        return "articul" in qn or bool(re.search(r"\barticul\w*", qn))
-    if root == "trat":
-        return any(x in qn for x in ["trata", "tema", "materia"])
+try:
+    import ahocorasick  # pyahocorasick: autómata Aho-Corasick en C (opcional)
+except Exception:  # pragma: no cover
+    ahocorasick = None
+
+# Claves y raíces de intent (subcadenas literales). En qn ya no hay tildes:
+# basta con la forma sin acentos.
+_INTENT_WORDS = {
+    "rgpd": ("rgpd", "gdpr", "reglamento 2016 679"),
+    "aepd": ("aepd", "agencia espanola de proteccion de datos"),
+    "vigente": ("vigent", "actual"),
+    "proteccion": ("proteccion de datos",),
+    "mencion": ("mencion",),
+    "modific": ("modifi",),
+    "derog": ("derog",),
+    "articul": ("articul",),
+    "trat": ("trata", "tema", "materia"),
+}
+
+# Sin pyahocorasick: una sola alternación dentro de un lookahead, para que
+# finditer pruebe cada posición sin consumir texto; así ninguna clave tapa a
+# otra que empiece dentro de ella, y el resultado equivale a los `in` sueltos.
+_RE_INTENT = re.compile("(?=" + "|".join(
+    f"(?P<{tag}>{'|'.join(map(re.escape, words))})" for tag, words in _INTENT_WORDS.items()
+) + ")")
+
+if ahocorasick is not None:
+    # mismo conjunto de claves como autómata: un recorrido lineal sin backtracking
+    # que informa de todas las apariciones, también las solapadas
+    _INTENT_AUTOMATON = ahocorasick.Automaton()
+    for _tag, _words in _INTENT_WORDS.items():
+        for _w in _words:
+            _INTENT_AUTOMATON.add_word(_w, _tag)
+    _INTENT_AUTOMATON.make_automaton()
+else:
+    _INTENT_AUTOMATON = None
+
+@functools.lru_cache(maxsize=1024)
+def _intents(qn: str) -> frozenset:
+    """Raíces de intent presentes en qn (ya normalizada con _norm), en una pasada (cacheado)."""
+    if _INTENT_AUTOMATON is not None:
+        return frozenset(tag for _, tag in _INTENT_AUTOMATON.iter(qn))
+    return frozenset(m.lastgroup for m in _RE_INTENT.finditer(qn))
+
+def _has_root(qn: str, root: str) -> bool:
+    """Detecta raíces verbales para intents (qn ya normalizada con _norm)."""
+    if root in _INTENT_WORDS:
+        return root in _intents(qn)
     return root in qn
 
 
@@ -56,7 +97,7 @@ def _has_root(q: str, root: str) -> bool:
 # 🧩 Sinónimos y normalización
 # ==============================================================
 
-_SYNONYMS = [
+_RAW_SYNONYMS = [
     (r"\brgpd\b", "reglamento ue 2016 679"),
     (r"\bgdpr\b", "reglamento ue 2016 679"),
     (r"reglamento\s+(ue\s*)?2016\s*/\s*679", "reglamento ue 2016 679"),
@@ -64,19 +105,28 @@ _SYNONYMS = [
     (r"\blo\s*15\s*/\s*1999\b", "lo 15 1999"),
     (r"\baepd\b", "aepd"),
 ]
+_SYNONYMS = [(re.compile(p), canon) for p, canon in _RAW_SYNONYMS]
+# Una sola alternación como prefiltro: la mayoría de preguntas no tiene sinónimo
+# y se descartan con una búsqueda. Si hay acierto se respeta el orden de la tabla
+# (no el de aparición en el texto), igual que antes.
+_SYNONYMS_ANY = re.compile("|".join(f"(?:{p})" for p, _ in _RAW_SYNONYMS))
+_RE_QUOTED = re.compile(r'"([^"]+)"')
+_RE_LUCENE_PHRASE_UNSAFE = re.compile(r'["\\]')
 
 def _apply_synonyms(qn: str) -> Optional[str]:
+    if not _SYNONYMS_ANY.search(qn):
+        return None
     for pat, canon in _SYNONYMS:
-        if re.search(pat, qn):
+        if pat.search(qn):
             return canon
     return None
 
-def _doc_term_from_question(q: str) -> str:
-    qn = _norm(q)
+def _doc_term_from_question(q: str, qn: Optional[str] = None) -> str:
+    qn = _norm(q) if qn is None else qn
     syn = _apply_synonyms(qn)
     if syn:
         return syn
-    m = re.search(r'"([^"]+)"', q)
+    m = _RE_QUOTED.search(q)
     if m:
         return _norm(m.group(1))
     return ""
@@ -93,11 +143,27 @@ _PAT_RD = re.compile(r"\brd\s*(\d{1,4})\s*/\s*(\d{4})\b", re.I)
 _PAT_LEY = re.compile(r"\bley\s*(\d{1,4})\s*/\s*(\d{4})\b", re.I)
 _PAT_NUMSLASH = re.compile(r"\b(\d{1,4})\s*/\s*(\d{4})\b", re.I)
 
-_TOPICS = {
-    "Protección de Datos": [r"proteccion\s+de\s+datos", r"\brgpd\b", r"\bgdpr\b"],
-    "Derechos Digitales": [r"derechos\s+digitales"],
-    "Transparencia": [r"\btransparencia\b"],
-}
+# Palabras clave del texto de un artículo (entidades, acciones, temas y
+# referencias abreviadas) en un único escáner sobre el texto normalizado. Como
+# _RE_INTENT, va dentro de un lookahead: finditer prueba cada posición sin
+# consumir texto y ninguna clave oculta a otra que empiece dentro de ella.
+_RE_SCAN = re.compile(
+    r"(?=(?P<aepd>\baepd\b|agencia\s+espanola\s+de\s+proteccion\s+de\s+datos)"
+    r"|(?P<rgpd>\brgpd\b|\bgdpr\b)"
+    r"|(?P<reglamento>reglamento\s+(?:ue\s*)?2016\s*/\s*679)"
+    r"|(?P<proteccion>proteccion\s+de\s+datos)"
+    r"|(?P<derechos_digitales>derechos\s+digitales)"
+    r"|(?P<transparencia>\btransparencia\b)"
+    r"|(?P<derog>derog)|(?P<modifi>modifi)|(?P<mencion>mencion)"
+    r"|(?P<lo_3_2018>lo 3 2018)|(?P<lo_15_1999>lo 15 1999)|(?P<n_2016_679>2016 679))"
+)
+
+# tema → claves de _RE_SCAN que lo activan (en orden de emisión)
+_TOPICS = (
+    ("Protección de Datos", frozenset({"proteccion", "rgpd"})),
+    ("Derechos Digitales", frozenset({"derechos_digitales"})),
+    ("Transparencia", frozenset({"transparencia"})),
+)
 
 
 # ==============================================================
@@ -117,169 +183,236 @@ def _find_doc_refs_in_text(text: str) -> Dict[str, List[str]]:
             refs["generic"].append(f"{n} {y}")
     return refs
 
-def _detect_actions(text: str) -> Dict[str, bool]:
-    t = _norm(text)
-    return {
-        "deroga": "derog" in t,
-        "modifica": "modific" in t or "modifi" in t,
-        "menciona": "mencion" in t,
-        "trata": any(re.search(p, t) for pats in _TOPICS.values() for p in pats),
-    }
-
-def _find_topics(text: str) -> List[str]:
-    t = _norm(text)
-    return [topic for topic, pats in _TOPICS.items() if any(re.search(p, t) for p in pats)]
+def _scan_text(tnorm: str) -> frozenset:
+    """Claves de _RE_SCAN presentes en tnorm (ya normalizado con _norm), en una pasada."""
+    return frozenset(m.lastgroup for m in _RE_SCAN.finditer(tnorm))
 
 
 # ==============================================================
 # 🧱 Construcción de Cypher para inferencia semántica
 # ==============================================================
 
+# Fragmentos por elemento emitido: la parte constante se escribe una sola vez
+# y cada elemento es un único .format + write.
+_TMPL_TOPIC = "MERGE ({a}:Tema {{nombre:'{t}'}})\nMERGE (d)-[:TRATA_SOBRE]->({a})\n"
+_TMPL_ENTIDAD = "MERGE ({a}:Entidad {{nombre:'{n}'}})\nMERGE (d)-[:MENCIONA]->({a})\n"
+_TMPL_DOC_REF = (
+    "MERGE ({a}:Documento {{id:'{t}'}})\n"
+    "ON CREATE SET {a}.titulo = coalesce({a}.titulo, '{t}')\n"
+    "MERGE (d)-[:{rel}]->({a})\n"
+)
+
+_ENTIDADES = (  # entidad → claves de _RE_SCAN, en orden de emisión
+    ("AEPD", frozenset({"aepd"})),
+    ("RGPD", frozenset({"rgpd", "reglamento"})),
+)
+_REF_KINDS = ("boe", "celex", "lo", "rd", "ley")  # orden de emisión de referencias
+# sin referencias explícitas, "menciona" + forma abreviada (clave de _RE_SCAN)
+_MENCION_HINTS = (
+    ("lo_3_2018", "lo 3 2018"),
+    ("lo_15_1999", "lo 15 1999"),
+    ("n_2016_679", "reglamento ue 2016 679"),
+)
+
+# Alias precalculados: temas y entidades están acotados por sus tablas; los
+# destinos no, así que pasado _N_X_ALIAS se vuelve al f-string.
+_T_ALIAS = tuple(f"t{i}" for i in range(len(_TOPICS)))
+_E_ALIAS = tuple(f"e{i}" for i in range(len(_ENTIDADES)))
+_N_X_ALIAS = 512
+_X_ALIAS = tuple(f"x{i}" for i in range(_N_X_ALIAS))
+
 def _merge_doc_by_id(doc_id: str) -> str:
     return f"MERGE (d:Documento {{id:'{_esc(doc_id)}'}})"
 
-def _infer_and_build(article_text: str, doc_id: str) -> str:
-    """Construye el bloque Cypher inferido desde un artículo (modo Aura)."""
+def _infer_and_build_iter(article_text: str, doc_id: str) -> Iterator[str]:
+    """
+    Genera el bloque Cypher inferido desde un artículo (modo Aura) por
+    fragmentos de líneas terminadas en "\\n"; no genera nada si no hay relaciones.
+    """
     text = article_text or ""
-    tnorm = _norm(text)
-    actions = _detect_actions(text)
+    if len(text) < 4:
+        return  # ninguna clave ni referencia cabe en menos de 4 caracteres
+    hits = _scan_text(_norm(text))
     refs = _find_doc_refs_in_text(text)
-    topics = _find_topics(text)
-
-    cy: List[str] = []
-    cy.append(_merge_doc_by_id(doc_id))
+    topics = [topic for topic, keys in _TOPICS if not keys.isdisjoint(hits)]
+    entities = [name for name, keys in _ENTIDADES if not keys.isdisjoint(hits)]
+    generic = [g for g in refs["generic"] if g != "2016 679"]
+    has_refs = bool(generic) or any(refs[k] for k in _REF_KINDS)
+    hints = [] if has_refs or "mencion" not in hits else [
+        canon for key, canon in _MENCION_HINTS if key in hits
+    ]
+    if not (topics or entities or has_refs or hints):
+        return  # no saldría ninguna relación: ni siquiera se arma el Cypher
+
+    yield _merge_doc_by_id(doc_id) + "\n"
 
     # 1️⃣ TÓPICOS
-    for idx, topic in enumerate(topics):
-        alias_t = f"t{idx}"
-        cy.append(f"MERGE ({alias_t}:Tema {{nombre:'{_esc(topic)}'}})")
-        cy.append(f"MERGE (d)-[:TRATA_SOBRE]->({alias_t})")
+    esc = _esc  # local: evita LOAD_GLOBAL en cada iteración
+    fmt = _TMPL_TOPIC.format
+    for alias, topic in zip(_T_ALIAS, topics):
+        yield fmt(a=alias, t=esc(topic))
 
     # 2️⃣ ENTIDADES
-    ent_idx = 0
-    if re.search(r"\baepd\b|agencia\s+espanola\s+de\s+proteccion\s+de\s+datos", tnorm):
-        cy.append(f"MERGE (e{ent_idx}:Entidad {{nombre:'AEPD'}})")
-        cy.append(f"MERGE (d)-[:MENCIONA]->(e{ent_idx})")
-        ent_idx += 1
-    if re.search(r"\brgpd\b|\bgdpr\b|reglamento\s+(ue\s*)?2016\s*/\s*679", tnorm):
-        cy.append(f"MERGE (e{ent_idx}:Entidad {{nombre:'RGPD'}})")
-        cy.append(f"MERGE (d)-[:MENCIONA]->(e{ent_idx})")
-        ent_idx += 1
+    fmt = _TMPL_ENTIDAD.format
+    for alias, name in zip(_E_ALIAS, entities):
+        yield fmt(a=alias, n=name)
 
     # 3️⃣ REFERENCIAS A OTROS DOCUMENTOS
-    doc_targets: List[str] = refs["boe"] + refs["celex"] + refs["lo"] + refs["rd"] + refs["ley"]
-    for g in refs["generic"]:
-        if g != "2016 679":
-            doc_targets.append(g)
-
-    if actions["menciona"] and not doc_targets:
-        if "lo 3 2018" in tnorm: doc_targets.append("lo 3 2018")
-        if "lo 15 1999" in tnorm: doc_targets.append("lo 15 1999")
-        if "2016 679" in tnorm: doc_targets.append("reglamento ue 2016 679")
+    # se recorren una sola vez: chain en lugar de concatenar cinco listas, y
+    # dict.fromkeys quita repetidos (mismo orden): un MERGE por documento citado
+    doc_targets: Iterable[str] = hints
+    if has_refs:
+        doc_targets = dict.fromkeys(chain(*(refs[k] for k in _REF_KINDS), generic))
+    rel_type = "DEROGA" if "derog" in hits else "MODIFICA" if "modifi" in hits else "MENCIONA_DOC"
+
+    fmt = _TMPL_DOC_REF.format
+    for idx, tgt in enumerate(doc_targets):
+        alias = _X_ALIAS[idx] if idx < _N_X_ALIAS else f"x{idx}"
+        yield fmt(a=alias, t=esc(tgt), rel=rel_type)  # esc una vez por destino
 
-    rel_type = "DEROGA" if actions["deroga"] else "MODIFICA" if actions["modifica"] else None
+    yield "RETURN 'Relaciones generadas en Neo4j Aura' AS status;"
 
-    for idx, tgt in enumerate(doc_targets):
-        alias_dst = f"x{idx}"
-        cy.append(f"MERGE ({alias_dst}:Documento {{id:'{_esc(tgt)}'}})")
-        cy.append(f"ON CREATE SET {alias_dst}.titulo = coalesce({alias_dst}.titulo, '{_esc(tgt)}')")
-        if rel_type:
-            cy.append(f"MERGE (d)-[:{rel_type}]->({alias_dst})")
-        else:
-            cy.append(f"MERGE (d)-[:MENCIONA_DOC]->({alias_dst})")
-
-    cy.append("RETURN 'Relaciones generadas en Neo4j Aura' AS status;")
-
-    result = "\n".join(cy)
-    stripped = re.sub(r"\s+", " ", result)
-    if not any(k in stripped for k in ["TRATA_SOBRE", "MENCIONA_DOC", "DEROGA", "MODIFICA", "MENCIONA]->(e"]):
-        return ""
-    return result
+def _infer_and_build(article_text: str, doc_id: str) -> str:
+    """Construye el bloque Cypher inferido desde un artículo (modo Aura)."""
+    return "".join(_infer_and_build_iter(article_text, doc_id))
 
 
 # ==============================================================
 # 🔎 Motor NL → Cypher (modo lectura mejorado)
 # ==============================================================
 
-def _rules(q: str) -> str:
-    qn = _norm(q)
-    term = _doc_term_from_question(q)
-    id_like = term.replace(" ", "-")
-
-    # --- NUEVOS PATRONES SEMÁNTICOS ---
-    if "rgpd" in qn or "gdpr" in qn or "reglamento 2016 679" in qn:
-        return """
+# Plantillas de cada intent, construidas una vez al importar: _rules_params solo
+# elige una y arma los params ($term, $id_like, $ft).
+_CY_RGPD = """
 MATCH (d:Documento)-[:MENCIONA]->(e:Entidad)
 WHERE toLower(e.nombre) CONTAINS 'rgpd' OR toLower(coalesce(e.norm,e.nombre)) CONTAINS '2016/679'
 RETURN DISTINCT d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    if "aepd" in qn or "agencia espanola de proteccion de datos" in qn:
-        return """
+_CY_AEPD = """
 MATCH (d:Documento)-[:MENCIONA]->(e:Entidad)
 WHERE toLower(e.nombre) CONTAINS 'aepd'
 RETURN DISTINCT d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    if "vigent" in qn or "actual" in qn:
-        return """
+_CY_VIGENTES = """
 MATCH (d:Documento)
 WHERE coalesce(d.vigente,true) = true
 RETURN DISTINCT d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    if "proteccion de datos" in qn or "protección de datos" in qn:
-        return """
+_CY_PROTECCION_DATOS = """
 MATCH (d:Documento)-[:TRATA_SOBRE]->(t:Tema)
 WHERE toLower(t.nombre) CONTAINS 'proteccion' AND toLower(t.nombre) CONTAINS 'datos'
 RETURN DISTINCT d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    # --- Reglas estándar originales (con mejoras) ---
-    if _has_root(q, "mencion"):
-        return f"""
+_CY_MENCION_FT = """
+CALL {
+  CALL db.index.fulltext.queryNodes('doc_fulltext', $ft) YIELD node
+  RETURN node AS x
+  UNION
+  MATCH (x:Entidad)
+  WHERE toLower(x.id) CONTAINS $id_like
+     OR toLower(coalesce(x.titulo, x.nombre)) CONTAINS $term
+  RETURN x
+}
 MATCH (d:Documento)-[:MENCIONA_DOC|MENCIONA]->(x)
-WHERE toLower(x.id) CONTAINS '{id_like}'
-   OR toLower(coalesce(x.titulo, x.nombre)) CONTAINS '{term}'
 RETURN DISTINCT d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    if _has_root(q, "modific"):
-        return """
+_CY_MENCION = """
+MATCH (d:Documento)-[:MENCIONA_DOC|MENCIONA]->(x)
+WHERE toLower(x.id) CONTAINS $id_like
+   OR toLower(coalesce(x.titulo, x.nombre)) CONTAINS $term
+RETURN DISTINCT d.id AS id, d.titulo AS titulo
+ORDER BY titulo
+""".strip()
+
+_CY_MODIFICA = """
 MATCH (a:Documento)-[:MODIFICA]->(b:Documento)
 RETURN a.id AS origen, b.id AS destino, 'MODIFICA' AS relacion
 ORDER BY origen
 """.strip()
 
-    if _has_root(q, "derog"):
-        return """
+_CY_DEROGA = """
 MATCH (a:Documento)-[:DEROGA]->(b:Documento)
 RETURN a.id AS origen, b.id AS destino, 'DEROGA' AS relacion
 ORDER BY origen
 """.strip()
 
-    if _has_root(q, "articul"):
-        return f"""
+_CY_ARTICULOS = """
 MATCH (d:Documento)-[:TIENE_ARTICULO]->(a:Articulo)
-WHERE toLower(d.id) CONTAINS '{id_like}' OR toLower(d.titulo) CONTAINS '{term}'
+WHERE toLower(d.id) CONTAINS $id_like OR toLower(d.titulo) CONTAINS $term
 RETURN d.id AS doc, a.numero AS numero, a.titulo AS titulo
-ORDER BY toInteger(coalesce(a.numero,'0')) ASC
+ORDER BY coalesce(a.numero_int, toInteger(a.numero), 0) ASC
 """.strip()
 
-    if "proteccion de datos" in qn or _has_root(q, "trat"):
-        return """
+_CY_TRATA_SOBRE = """
 MATCH (d:Documento)-[:TRATA_SOBRE]->(t:Tema)
 WHERE toLower(t.nombre) CONTAINS 'proteccion' AND toLower(t.nombre) CONTAINS 'datos'
 RETURN d.id AS id, d.titulo AS titulo
 ORDER BY titulo
 """.strip()
 
-    return "RETURN 'Pregunta no reconocida' AS aviso"
+_CY_NO_RECONOCIDA = "RETURN 'Pregunta no reconocida' AS aviso"
+
+# intent → (plantilla, ¿usa $term/$id_like?), en orden de prioridad
+_RULES = {
+    "rgpd": (_CY_RGPD, False),
+    "aepd": (_CY_AEPD, False),
+    "vigente": (_CY_VIGENTES, False),
+    "proteccion": (_CY_PROTECCION_DATOS, False),
+    "mencion": (_CY_MENCION, True),
+    "modific": (_CY_MODIFICA, False),
+    "derog": (_CY_DEROGA, False),
+    "articul": (_CY_ARTICULOS, True),
+    "trat": (_CY_TRATA_SOBRE, False),
+}
+
+def _rules_params(q: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Cypher parametrizado ($term, $id_like) + parámetros: el texto de la query es
+    el mismo para todas las preguntas de un intent y Neo4j reutiliza el plan.
+    """
+    qn = _norm(q)  # una sola normalización por pregunta
+    intents = _intents(qn)  # un solo escaneo; el orden de _RULES fija la prioridad
+    for tag, (cy, parametrized) in _RULES.items():
+        if tag not in intents:
+            continue
+        if not parametrized:
+            return cy, {}
+        term = _doc_term_from_question(q, qn)
+        params = {"term": term, "id_like": term.replace(" ", "-")}
+        if tag == "mencion" and term:
+            # documentos citados vía índice full-text (id/titulo/alias); entidades
+            # por CONTAINS. Frase Lucene sin comillas ni barras que rompan la sintaxis
+            params["ft"] = '"' + _RE_LUCENE_PHRASE_UNSAFE.sub(" ", term) + '"'
+            return _CY_MENCION_FT, params
+        return cy, params
+    return _CY_NO_RECONOCIDA, {}
+
+
+def _render_literals(cy: str, params: Dict[str, Any]) -> str:
+    """Sustituye $param por literales escapados (Cypher autocontenido, como antes)."""
+    for k, v in params.items():
+        cy = cy.replace(f"${k}", f"'{_esc(str(v))}'")
+    return cy
+
+@functools.lru_cache(maxsize=2048)
+def _rules(q: str) -> str:
+    """
+    Cypher autocontenido para q; puro, así que se memoriza (lo comparten gen y
+    gen_ex). Parte del despacho ya cacheado de gen_params: una sola ejecución
+    de las reglas por pregunta, la use quien la use primero.
+    """
+    cy, params = _gen_params_cached(q)
+    return _render_literals(cy, dict(params))
 
 
 # ==============================================================
@@ -291,6 +424,20 @@ def gen(q: str, doc_id: str | None = None) -> str:
         return _infer_and_build(q, doc_id)
     return _rules(q)
 
+# Streamlit reejecuta la página en cada interacción con la misma pregunta: las
+# salidas (puras dado q) se memorizan. Los params se guardan congelados y se
+# devuelve un dict nuevo en cada llamada, para que nadie mute la caché.
+@functools.lru_cache(maxsize=256)
+def _gen_params_cached(q: str) -> Tuple[str, Tuple[Tuple[str, Any], ...]]:
+    cy, params = _rules_params(q)
+    return cy, tuple(params.items())
+
+def gen_params(q: str) -> Tuple[str, Dict[str, Any]]:
+    """Como gen(q) pero devuelve (cypher, params) para run_cypher(cy, parameters=params)."""
+    cy, params = _gen_params_cached(q)
+    return cy, dict(params)
+
+@functools.lru_cache(maxsize=256)
 def gen_ex(q: str, mode: str = "auto") -> Tuple[str, str]:
     cy = _rules(q)
     return cy, "rules"